@@ -0,0 +1,47 @@
+import random
+
+# Synthetic designs for the benchmarks. Everything is seeded so every run measures the same work.
+
+def deepEquation(depth: int):
+    # Nested parentheses depth levels deep: ((x + 0) * y + 1) * y ...
+    equation = "x"
+    for index in range(depth):
+        equation = f"({equation} + {index}) * y"
+    return equation
+
+def wideSum(width: int):
+    # x0 + x1 + ... with width variables
+    return " + ".join(f"x{index}" for index in range(width))
+
+def mixedEquation(seed: int, terms: int = 12):
+    # A typical hand written equation with functions, constants and repeated variables
+    generator = random.Random(seed)
+    parts = []
+    for index in range(terms):
+        variable = "v" + str(generator.randrange(6))
+        choice = generator.randrange(4)
+        if choice == 0:
+            parts.append(f"{variable} * {generator.randrange(1, 9)}")
+        elif choice == 1:
+            parts.append(f"SQRT({variable} ^ 2 + {generator.randrange(1, 5)})")
+        elif choice == 2:
+            parts.append(f"MAX({variable}, {generator.randrange(9)}) / 2")
+        else:
+            parts.append(f"dSIN({variable}) - {variable}")
+    return " + ".join(parts)
+
+def manyEquations(count: int):
+    return [mixedEquation(seed) for seed in range(count)]
+
+def wiredGraph(logicData, blockCount: int, fanIn: int = 2, seed: int = 0):
+    # Adds blockCount components to logicData, each wired to up to fanIn earlier blocks
+    generator = random.Random(seed)
+    functions = ("ADD", "SUB", "MULT", "MAX", "MIN")
+    names = []
+    for index in range(blockCount):
+        logicBlock = logicData.addLogicBlock(functions[generator.randrange(len(functions))], 1.0, 0.0)
+        if names:
+            for sourceName in set(generator.choice(names[-64:]) for _ in range(fanIn)):
+                logicData.updateLogicBlock(logicBlock.name, inputA=sourceName)
+        names.append(logicBlock.name)
+    return names
@@ -0,0 +1,343 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+# Benchmarks for the hot paths: parsing, compiling equations, LogicData edits, exporting and the designer scene.
+#
+#   python benchmarks/run.py                  compare against baseline.json, exit 1 on a regression
+#   python benchmarks/run.py --save           record a new baseline
+#   python benchmarks/run.py -k export        only run benchmarks whose name contains "export"
+#
+# Times are divided by a fixed pure Python calibration loop before they are compared, so a baseline recorded
+# on one machine is still meaningful on another. The local BRCI stub is always used, so exports measure
+# LogiBrick's conversion and not .brv serialization.
+
+benchmarkDir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(benchmarkDir, "stubs"))
+sys.path.insert(1, os.path.join(os.path.dirname(benchmarkDir), "src"))
+
+import generators
+import Logic
+import Placement
+import Project
+
+baselinePath = os.path.join(benchmarkDir, "baseline.json")
+
+benchmarks = []
+
+def benchmark(name: str, qt: bool = False):
+    # Registers run(state) with a setup() that builds fresh state for every repeat
+    def register(setup):
+        def decorator(run):
+            benchmarks.append((name, setup, run, qt))
+            return run
+        return decorator
+    return register
+
+def calibrate():
+    total = 0
+    for index in range(2_000_000):
+        total += index % 7
+    return total
+
+def measure(setup, run, repeat: int):
+    best = None
+    for _ in range(repeat):
+        state = setup()
+        start = time.perf_counter()
+        run(state)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def withEmptyCache(state=None):
+    # Compile benchmarks measure compiling, not template cache hits
+    Logic.equationCache.clear()
+    return state
+
+# Parsing
+
+deepText = generators.deepEquation(400)
+wideText = generators.wideSum(2000)
+
+@benchmark("tokenize shuntingYard deep")(lambda: Logic.EquationBlock("EQN1", deepText))
+def benchShuntingDeep(equationBlock):
+    equationBlock.shuntingYard(equationBlock.equation)
+
+@benchmark("tokenize shuntingYard wide")(lambda: Logic.EquationBlock("EQN1", wideText))
+def benchShuntingWide(equationBlock):
+    equationBlock.shuntingYard(equationBlock.equation)
+
+# Compiling
+
+for level in (0, 1, 2):
+    @benchmark(f"generateLogicBlocks deep O{level}")(lambda level=level: withEmptyCache(Logic.EquationBlock("EQN1", deepText, level)))
+    def benchGenerateDeep(equationBlock):
+        equationBlock.generateLogicBlocks()
+
+    @benchmark(f"generateLogicBlocks wide O{level}")(lambda level=level: withEmptyCache(Logic.EquationBlock("EQN1", wideText, level)))
+    def benchGenerateWide(equationBlock):
+        equationBlock.generateLogicBlocks()
+
+def cachedEquationBlock():
+    withEmptyCache()
+    Logic.EquationBlock("EQN1", generators.mixedEquation(0)).generateLogicBlocks()
+    return [Logic.EquationBlock("EQN" + str(index), generators.mixedEquation(0)) for index in range(500)]
+
+@benchmark("generateLogicBlocks cached x500")(cachedEquationBlock)
+def benchGenerateCached(equationBlocks):
+    for equationBlock in equationBlocks:
+        equationBlock.generateLogicBlocks()
+
+# LogicData mutations
+
+manyTexts = generators.manyEquations(300)
+
+@benchmark("addEquationBlock x300")(lambda: withEmptyCache(Logic.LogicData()))
+def benchAddEquations(logicData):
+    for equation in manyTexts:
+        logicData.addEquationBlock(equation)
+
+def equationsToUpdate():
+    logicData = Logic.LogicData()
+    names = [logicData.addEquationBlock(equation).name for equation in manyTexts[:100]]
+    return logicData, names
+
+@benchmark("updateEquationBlock x100")(equationsToUpdate)
+def benchUpdateEquations(state):
+    logicData, names = state
+    for index, name in enumerate(names):
+        logicData.updateEquationBlock(name, manyTexts[index + 100])
+
+@benchmark("wire and remove blocks x5000")(Logic.LogicData)
+def benchMutations(logicData):
+    names = generators.wiredGraph(logicData, 5000)
+    for name in names[::2]:
+        logicData.removeLogicBlock(name)
+
+# Graph passes and exporting
+
+def wiredDesign(blockCount: int):
+    logicData = Logic.LogicData()
+    generators.wiredGraph(logicData, blockCount)
+    for equation in manyTexts[:50]:
+        logicData.addEquationBlock(equation)
+    return logicData
+
+largeDesign = None
+
+def largeWiredDesign():
+    global largeDesign
+    if largeDesign is None:
+        largeDesign = wiredDesign(20000)
+    return largeDesign
+
+@benchmark("topologicalOrder 20k")(largeWiredDesign)
+def benchTopologicalOrder(logicData):
+    Logic.topologicalOrder(logicData.logicData, sortedNames=True)
+
+@benchmark("placement 20k")(lambda: Logic.topologicalOrder(largeWiredDesign().logicData))
+def benchPlacement(orderedBlocks):
+    Placement.BrickPlacement().place(orderedBlocks)
+
+@benchmark("export 20k")(lambda: Logic.LogicExporter(largeWiredDesign()))
+def benchExport(exporter):
+    exporter.convertLogicDataToCreation("benchmark", tempfile.gettempdir())
+
+@benchmark("export 20k shared and pruned")(lambda: Logic.LogicExporter(largeWiredDesign(), shareSubexpressions=True, prune=True))
+def benchExportOptimized(exporter):
+    exporter.convertLogicDataToCreation("benchmark", tempfile.gettempdir())
+
+@benchmark("export fingerprint 20k")(lambda: Logic.LogicExporter(largeWiredDesign()))
+def benchFingerprint(exporter):
+    exporter.fingerprint("benchmark")
+
+projectPath = os.path.join(tempfile.gettempdir(), "logibrick-benchmark.lbk")
+
+@benchmark("saveProject 20k")(largeWiredDesign)
+def benchSaveProject(logicData):
+    Project.saveProject(projectPath, logicData, [(name, "ADD", 0.0, 0.0) for name in logicData.logicData])
+
+def savedProject():
+    benchSaveProject(largeWiredDesign())
+    return projectPath
+
+@benchmark("loadProject 20k")(savedProject)
+def benchLoadProject(path):
+    Project.loadProject(path)
+
+# Designer scene, offscreen
+
+application = None
+
+def designerScene(componentCount: int, wired: bool):
+    # A scene with componentCount components in a grid, each wired to the one before it
+    global application
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtCore import QPointF
+    from PyQt5.QtWidgets import QApplication
+    import UI
+    if application is None:
+        application = QApplication.instance() or QApplication([])
+
+    logicData = Logic.LogicData()
+    scene = UI.CircuitDesignerScene(logicData)
+    view = UI.CircuitDesignerView(scene)
+    scene.setMainView()
+    components = []
+    for index in range(componentCount):
+        logicBlock = logicData.addLogicBlock("ADD")
+        components.append(scene.placeComponent(logicBlock.name, "ADD", (index % 40) * 250, (index // 40) * 250))
+    if wired:
+        for source, target in zip(components, components[1:]):
+            scene.startWire(source.outpuPin, QPointF(0, 0))
+            scene.finishWire(source.outpuPin, target.inputPins[0])
+    # Lets the scene index the new items, as the event loop would
+    application.processEvents()
+    return scene, view, components
+
+@benchmark("scene place 500 components", qt=True)(lambda: designerScene(0, False))
+def benchScenePlace(state):
+    scene, view, components = state
+    for index in range(500):
+        logicBlock = scene.logicData.addLogicBlock("ADD")
+        scene.placeComponent(logicBlock.name, "ADD", (index % 40) * 250, (index // 40) * 250)
+
+@benchmark("scene wire 500 components", qt=True)(lambda: designerScene(500, False))
+def benchSceneWire(state):
+    from PyQt5.QtCore import QPointF
+    scene, view, components = state
+    for source, target in zip(components, components[1:]):
+        scene.startWire(source.outpuPin, QPointF(0, 0))
+        scene.finishWire(source.outpuPin, target.inputPins[0])
+
+@benchmark("scene drag 500 wired components", qt=True)(lambda: designerScene(500, True))
+def benchSceneDrag(state):
+    scene, view, components = state
+    for step in range(5):
+        for component in components:
+            component.moveBy(3, 2)
+    application.processEvents()
+
+@benchmark("scene render 500 wired components", qt=True)(lambda: designerScene(500, True))
+def benchSceneRender(state):
+    from PyQt5.QtGui import QImage, QPainter
+    scene, view, components = state
+    image = QImage(1600, 1200, QImage.Format_ARGB32)
+    painter = QPainter(image)
+    # Zoomed in on a corner, then the whole design zoomed out
+    scene.render(painter, source=scene.itemsBoundingRect().adjusted(0, 0, -8000, -2000))
+    scene.render(painter, source=scene.itemsBoundingRect())
+    painter.end()
+
+@benchmark("scene render zoomed out 500 wired components", qt=True)(lambda: designerScene(500, True))
+def benchSceneRenderZoomedOut(state):
+    from PyQt5.QtGui import QImage, QPainter
+    scene, view, components = state
+    image = QImage(1600, 1200, QImage.Format_ARGB32)
+    painter = QPainter(image)
+    # The whole design at the scale the view would show it
+    view.scale(0.15, 0.15)
+    scene.setZoom(view.transform().m11())
+    scene.render(painter, source=scene.itemsBoundingRect())
+    painter.end()
+
+@benchmark("scene hit test 500 wired components", qt=True)(lambda: designerScene(500, True))
+def benchSceneHitTest(state):
+    from PyQt5.QtCore import QPointF
+    from PyQt5.QtGui import QTransform
+    scene, view, components = state
+    # Points on and around the wires, then spread over the whole design
+    for component in components:
+        for pin in component.inputPins:
+            for wire in pin.wires:
+                center = wire.boundingRect().center()
+                scene.itemAt(center, QTransform())
+                scene.itemAt(center + QPointF(3, 12), QTransform())
+    for index in range(1000):
+        scene.itemAt(QPointF((index * 37) % 10000, (index * 53) % 3200), QTransform())
+
+scenePath = os.path.join(tempfile.gettempdir(), "logibrick-benchmark-scene.lbk")
+
+def sceneProject(componentCount: int):
+    # A saved wired design laid out in a grid, and an empty scene to load it into
+    logicData = Logic.LogicData()
+    names = generators.wiredGraph(logicData, componentCount)
+    Project.saveProject(scenePath, logicData, [(name, logicData.logicData[name].function, (index % 100) * 250, (index // 100) * 250) for index, name in enumerate(names)])
+    scene, view, components = designerScene(0, False)
+    return scene, Project.loadProject(scenePath, scene.logicData)
+
+@benchmark("scene load project 3000 wired components", qt=True)(lambda: sceneProject(3000))
+def benchSceneLoad(state):
+    from PyQt5.QtCore import QPointF
+    from PyQt5.QtGui import QTransform
+    scene, project = state
+    scene.loadProject(project)
+    while scene.pendingComponents is not None:
+        application.processEvents()
+    # Hit tests after loading, the first one pays for building the index
+    for index in range(1000):
+        scene.itemAt(QPointF((index * 37) % 25000, (index * 53) % 7500), QTransform())
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="LogiBrick benchmarks")
+    parser.add_argument("-k", "--filter", default="", help="only run benchmarks whose name contains this text")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per benchmark, the fastest counts")
+    parser.add_argument("--tolerance", type=float, default=2.0, help="how many times slower than the baseline counts as a regression")
+    parser.add_argument("--save", action="store_true", help="record the results as the new baseline")
+    parser.add_argument("--no-qt", action="store_true", help="skip the designer scene benchmarks")
+    args = parser.parse_args(argv)
+
+    calibration = measure(lambda: None, lambda state: calibrate(), 5)
+    baseline = {}
+    if os.path.exists(baselinePath):
+        with open(baselinePath, "r", encoding="utf-8") as file:
+            baseline = json.load(file).get("benchmarks", {})
+
+    results = {}
+    regressions = []
+    print(f"{'benchmark':40} {'seconds':>10} {'relative':>10} {'baseline':>10}")
+    for name, setup, run, qt in benchmarks:
+        if args.filter not in name:
+            continue
+        if qt and args.no_qt:
+            continue
+        try:
+            seconds = measure(setup, run, args.repeat)
+        except ImportError as error:
+            print(f"{name:40} skipped ({error})")
+            continue
+        relative = seconds / calibration
+        results[name] = {"seconds": round(seconds, 6), "relative": round(relative, 4)}
+        expected = baseline.get(name, {}).get("relative")
+        change = ""
+        if expected:
+            change = f"{relative / expected:9.2f}x"
+            if relative > expected * args.tolerance:
+                regressions.append(name)
+                change += " REGRESSION"
+        print(f"{name:40} {seconds:10.4f} {relative:10.3f} {change}")
+
+    if args.save:
+        saved = {}
+        if os.path.exists(baselinePath):
+            with open(baselinePath, "r", encoding="utf-8") as file:
+                saved = json.load(file).get("benchmarks", {})
+        saved.update(results)
+        with open(baselinePath, "w", encoding="utf-8") as file:
+            json.dump({"machine": platform.platform(), "python": platform.python_version(), "benchmarks": saved}, file, indent=2, sort_keys=True)
+            file.write("\n")
+        print(f"Saved {len(results)} results to {baselinePath}")
+        return 0
+
+    if regressions:
+        print(f"{len(regressions)} regressions: {', '.join(regressions)}")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
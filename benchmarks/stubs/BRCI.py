@@ -0,0 +1,24 @@
+# Stand-in for BRCI so exporter benchmarks measure LogiBrick's conversion and not .brv serialization.
+# Implements the parts of BRCI.ModernCreation that LogicExporter uses.
+
+class ModernCreation:
+    def __init__(self, project_name: str, project_dir: str):
+        self.project_name = project_name
+        self.project_dir = project_dir
+        self.bricks = []
+
+    @staticmethod
+    def get_brick_rigs_vehicle_folder():
+        return "."
+
+    def add_brick(self, brick_type: str, brick_name: str, position=None, rotation=None, properties=None):
+        self.bricks.append((brick_type, brick_name, position, rotation, properties))
+
+    def write_creation(self, exist_ok: bool = False):
+        pass
+
+    def write_metadata(self, exist_ok: bool = False):
+        pass
+
+class Creation14(ModernCreation):
+    pass
@@ -0,0 +1,70 @@
+import Logic
+
+# Latency and size analysis of a design. Every math brick adds a tick of delay, so the number of bricks on the
+# longest chain ending at an output is the number of ticks an input change needs to reach that output.
+
+class LogicAnalysis:
+    def __init__(self, logicData: Logic.LogicData):
+        self.logicData = logicData
+        # name -> bricks on the longest chain ending at (and including) the block
+        self.depths = {}
+        # name -> number of blocks reading from the block
+        self.fanOut = {}
+        # name -> the source on the block's longest chain, None for blocks without wired sources
+        self.criticalSource = {}
+        self.outputNames = []
+        self.mathBrickCount = 0
+        self.textBrickCount = 0
+        self.analyze()
+
+    def analyze(self):
+        blocks = self.logicData.logicData
+        self.fanOut = {name: 0 for name in blocks}
+
+        logicBlock: Logic.LogicBlock
+        for logicBlock in Logic.topologicalOrder(blocks):
+            depth = 0
+            criticalSource = None
+            for sourceName in logicBlock.sourceNames():
+                if sourceName not in blocks:
+                    continue
+                self.fanOut[sourceName] += 1
+                if self.depths[sourceName] > depth:
+                    depth = self.depths[sourceName]
+                    criticalSource = sourceName
+            self.depths[logicBlock.name] = depth + 1
+            self.criticalSource[logicBlock.name] = criticalSource
+            if logicBlock.separate:
+                self.textBrickCount += 1
+
+        self.mathBrickCount = len(blocks)
+
+        # Equation outputs and anything nothing reads from
+        equationOutputs = [equationBlock.outputBlockName for equationBlock in self.logicData.equationBlocks.values()]
+        self.outputNames = equationOutputs + [name for name, count in self.fanOut.items() if count == 0 and name not in equationOutputs]
+
+    def criticalPath(self, name: str=None):
+        # Longest chain of blocks ending at name (or the deepest block in the design), listed source first
+        if name is None:
+            if len(self.depths) == 0:
+                return []
+            name = max(self.depths, key=self.depths.get)
+        path = []
+        while name is not None:
+            path.append(name)
+            name = self.criticalSource[name]
+        path.reverse()
+        return path
+
+    def outputDepths(self):
+        return {name: self.depths[name] for name in self.outputNames}
+
+    def summary(self):
+        lines = [f"Bricks: {self.mathBrickCount + self.textBrickCount} ({self.mathBrickCount} math, {self.textBrickCount} text)"]
+        if len(self.depths) > 0:
+            maxFanOutName = max(self.fanOut, key=self.fanOut.get)
+            lines.append(f"Max fan-out: {self.fanOut[maxFanOutName]} ({maxFanOutName})")
+            for name, depth in sorted(self.outputDepths().items(), key=lambda item: -item[1]):
+                lines.append(f"{name}: {depth} bricks deep")
+            lines.append("Critical path: " + " -> ".join(self.criticalPath()))
+        return "\n".join(lines)
@@ -0,0 +1,91 @@
+import concurrent.futures
+import logging
+
+import Analysis
+import ExportCache
+import Logic
+import Optimizer
+import Placement
+import Project
+
+# Exports many creations at once, e.g. variants of one vehicle with different constants. Jobs run in a
+# process pool and results come back in job order, so the output doesn't depend on which worker
+# finished first. Jobs are sent to the workers, so everything they hold has to pickle.
+
+logger = logging.getLogger(__name__)
+
+class ExportJob:
+    # One creation, built from equations (one EQN block each) or a saved project
+    def __init__(self, name: str, equations: list = None, projectPath: str = None, outputDir: str = None, optimizationLevel: int = Optimizer.defaultOptimizationLevel, shareSubexpressions: bool = False, prune: bool = False, placement: Placement.BrickPlacement = None, analyze: bool = False, palette: list = None, cache: ExportCache.ExportCache = None):
+        self.name = name
+        self.equations = equations
+        self.projectPath = projectPath
+        self.outputDir = outputDir
+        self.optimizationLevel = optimizationLevel
+        self.shareSubexpressions = shareSubexpressions
+        self.prune = prune
+        self.placement = placement
+        self.analyze = analyze
+        self.palette = palette
+        self.cache = cache
+
+    def buildLogicData(self):
+        if self.projectPath:
+            return Project.loadProject(self.projectPath).logicData
+        logicData = Logic.LogicData()
+        logicData.optimizationLevel = self.optimizationLevel
+        for equation in self.equations:
+            logicData.addEquationBlock(equation)
+        return logicData
+
+    def run(self):
+        result = ExportResult(self.name)
+        try:
+            logicData = self.buildLogicData()
+            if self.analyze:
+                result.analysis = Analysis.LogicAnalysis(logicData).summary()
+            exporter = Logic.LogicExporter(logicData, self.shareSubexpressions, self.prune, self.placement, self.palette, self.cache)
+            result.removed = exporter.convertLogicDataToCreation(self.name, self.outputDir)
+        except Exception as error:
+            result.error = str(error)
+        return result
+
+class ExportResult:
+    def __init__(self, name: str):
+        self.name = name
+        # Error message if the export failed
+        self.error = None
+        # {removed block name: reason} when pruning
+        self.removed = {}
+        self.analysis = None
+
+def runJob(job: ExportJob):
+    return job.run()
+
+def exportBatch(jobs: list, maxWorkers: int = None, progress=None):
+    # Runs every job and returns their ExportResults in job order. progress(done, total, result) is called
+    # in this process as each job finishes. maxWorkers=1 runs the jobs here without a pool.
+    names = set()
+    for job in jobs:
+        if job.name in names:
+            # Two jobs writing the same creation would race
+            raise ValueError(f"More than one job exports {job.name}")
+        names.add(job.name)
+
+    results = [None] * len(jobs)
+    if maxWorkers == 1 or len(jobs) <= 1:
+        for index, job in enumerate(jobs):
+            results[index] = runJob(job)
+            if progress:
+                progress(index + 1, len(jobs), results[index])
+        return results
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=maxWorkers) as executor:
+        futures = {executor.submit(runJob, job): index for index, job in enumerate(jobs)}
+        for done, future in enumerate(concurrent.futures.as_completed(futures), start=1):
+            index = futures[future]
+            results[index] = future.result()
+            logger.debug("%s finished (%d of %d)", results[index].name, done, len(jobs))
+            if progress:
+                progress(done, len(jobs), results[index])
+    return results
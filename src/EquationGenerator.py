@@ -233,4 +233,5 @@ def generateCreation(name: str, equation: str):
     creation.write_creation(exist_ok=True)  # Create the Vehicle.brv file, overwriting if required
     creation.write_metadata(exist_ok=True)  # Create the Metadata.brm file, overwriting if required
 
-generateCreation("TestGen", equation)
\ No newline at end of file
+if __name__ == '__main__':
+    generateCreation("TestGen", equation)
\ No newline at end of file
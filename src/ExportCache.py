@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+
+# Content addressed cache of exported creations. An export is keyed by a fingerprint of the design and
+# every option that changes the written files. A creation folder whose marker already holds that
+# fingerprint (and all the files listed in it) is left alone, and a fingerprint seen before is copied from
+# the cache instead of converted.
+
+# Bump when the marker or cache layout changes, exporter changes go into the fingerprint records
+cacheVersion = 2
+
+def defaultCacheDir():
+    return os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "logibrick")
+
+class ExportCache:
+    # Written into each creation folder, holds the fingerprint of the export that produced it
+    markerName = ".logibrick"
+
+    def __init__(self, cacheDir: str = None, maxEntries: int = 64):
+        self.cacheDir = cacheDir if cacheDir else defaultCacheDir()
+        self.maxEntries = maxEntries
+
+    def fingerprint(self, records):
+        # records is an iterable of JSON serializable values, hashed one after another
+        hasher = hashlib.sha256(str(cacheVersion).encode("utf-8"))
+        for record in records:
+            hasher.update(json.dumps(record, separators=(",", ":")).encode("utf-8"))
+            hasher.update(b"\n")
+        return hasher.hexdigest()
+
+    def entryPath(self, fingerprint: str):
+        return os.path.join(self.cacheDir, fingerprint)
+
+    def readMarker(self, creationDir: str):
+        try:
+            with open(os.path.join(creationDir, self.markerName), "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def exportedFiles(self, creationDir: str):
+        # Paths of everything the export wrote, relative to creationDir
+        files = []
+        for directory, directoryNames, fileNames in os.walk(creationDir):
+            for fileName in fileNames:
+                path = os.path.relpath(os.path.join(directory, fileName), creationDir)
+                if path != self.markerName:
+                    files.append(path.replace(os.sep, "/"))
+        return sorted(files)
+
+    def writeMarker(self, creationDir: str, fingerprint: str, removed: dict):
+        files = self.exportedFiles(creationDir)
+        with open(os.path.join(creationDir, self.markerName), "w", encoding="utf-8") as file:
+            json.dump({"fingerprint": fingerprint, "removed": removed, "files": files}, file)
+
+    def matches(self, directory: str, fingerprint: str):
+        # Returns the marker if directory holds the complete export with this fingerprint, or None
+        marker = self.readMarker(directory)
+        if marker is None or marker.get("fingerprint") != fingerprint or not marker.get("files"):
+            return None
+        for path in marker["files"]:
+            if not os.path.isfile(os.path.join(directory, path)):
+                return None
+        return marker
+
+    def isCurrent(self, creationDir: str, fingerprint: str):
+        # Returns the marker of an up to date creation folder, or None
+        return self.matches(creationDir, fingerprint)
+
+    def restore(self, fingerprint: str, creationDir: str):
+        # Copies a cached export into creationDir, returns its marker or None if it isn't cached
+        entryPath = self.entryPath(fingerprint)
+        marker = self.matches(entryPath, fingerprint)
+        if marker is None:
+            return None
+        shutil.copytree(entryPath, creationDir, dirs_exist_ok=True)
+        # Marks the entry as recently used
+        os.utime(entryPath)
+        return marker
+
+    def store(self, fingerprint: str, creationDir: str, removed: dict):
+        if not os.path.isdir(creationDir):
+            return
+        self.writeMarker(creationDir, fingerprint, removed)
+        entryPath = self.entryPath(fingerprint)
+        if os.path.isdir(entryPath):
+            if self.matches(entryPath, fingerprint) is not None:
+                return
+            # Files went missing from the entry, it's replaced below
+            shutil.rmtree(entryPath, ignore_errors=True)
+        os.makedirs(self.cacheDir, exist_ok=True)
+        # Copied under a temporary name and renamed, so a half written entry is never used
+        temporaryPath = entryPath + "." + uuid.uuid4().hex + ".tmp"
+        shutil.copytree(creationDir, temporaryPath)
+        try:
+            os.rename(temporaryPath, entryPath)
+        except OSError:
+            # Another process stored the same export first
+            shutil.rmtree(temporaryPath, ignore_errors=True)
+        self.evict()
+
+    def evict(self):
+        # Removes the least recently used entries above maxEntries
+        entries = []
+        for entryName in os.listdir(self.cacheDir):
+            entryPath = os.path.join(self.cacheDir, entryName)
+            if entryName.endswith(".tmp") or not os.path.isdir(entryPath):
+                continue
+            try:
+                entries.append((os.path.getmtime(entryPath), entryPath))
+            except OSError:
+                continue
+        entries.sort()
+        for modified, entryPath in entries[:max(0, len(entries) - self.maxEntries)]:
+            shutil.rmtree(entryPath, ignore_errors=True)
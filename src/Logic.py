@@ -1,15 +1,82 @@
 import constants
-import BRCI
-
+import Optimizer
+import ExportCache
+import Placement
+
+# BRCI is only needed to write .brv creations, the rest of the logic works without it
+try:
+    import BRCI
+except ImportError:
+    BRCI = None
+
+import logging
+import os
 import pprint
-import random
+import re
+import sys
+import zlib
+from collections import OrderedDict
+
+tokenPattern = re.compile(r"\s*(?:(?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)|(?P<name>[A-Za-z_][A-Za-z0-9_]*)|(?P<symbol>[-+*/%^<>(),]))")
+powerPattern = re.compile(r"\s*\^")
+
+logger = logging.getLogger(__name__)
+
+class LogicCycleError(Exception):
+    def __init__(self, cycle):
+        self.cycle = cycle
+        super().__init__("Logic blocks form a cycle: " + " -> ".join(cycle))
+
+def subexpressionKey(function, inputA, inputB):
+    # Blocks with equal keys always output the same value, so one brick can stand in for all of them.
+    # Wired channels sum their sources, so source order never matters.
+    def operandKey(operand):
+        if isinstance(operand, str):
+            return (operand,)
+        elif isinstance(operand, list):
+            return tuple(sorted(operand))
+        return float(operand) if operand is not None else 0.0
+
+    keyA = operandKey(inputA)
+    keyB = operandKey(inputB) if function in constants.functionsWithTwoInputs else None
+    if function in constants.commutativeFunctions:
+        keyA, keyB = sorted((keyA, keyB), key=lambda key: (isinstance(key, tuple), str(key)))
+    return (function, keyA, keyB)
+
+class EquationCache:
+    # Least recently used cache of compiled equation templates, keyed by normalized equation text
+    def __init__(self, maxSize: int=256):
+        self.maxSize = maxSize
+        self.templates = OrderedDict()
+
+    def get(self, key):
+        template = self.templates.get(key)
+        if template is not None:
+            self.templates.move_to_end(key)
+        return template
+
+    def put(self, key, template):
+        self.templates[key] = template
+        self.templates.move_to_end(key)
+        while len(self.templates) > self.maxSize:
+            self.templates.popitem(last=False)
+
+    def clear(self):
+        self.templates.clear()
+
+equationCache = EquationCache()
 
 class LogicBlock:
-    def __init__(self, name, function, inputA=0, inputB=0, separate: bool=False):
-        self.name = name
-        self.function = function
-        self.inputA = None
-        self.inputB = None
+    # Slots and interned names keep designs with tens of thousands of blocks small.
+    # Inputs are either a float constant or a list of source block names, numbers are converted to float
+    # and a missing input is 0.0.
+    __slots__ = ("name", "function", "inputA", "inputB", "separate", "label")
+
+    def __init__(self, name, function, inputA=0.0, inputB=0.0, separate: bool=False):
+        self.name = sys.intern(name)
+        self.function = sys.intern(function)
+        self.inputA = 0.0
+        self.inputB = 0.0
         self.separate = separate
         self.label = ""
         self.updateInputs(inputA, inputB)
@@ -17,158 +84,403 @@ class LogicBlock:
     def __str__(self):
         return f"[Name: {self.name}, Function: {self.function}, inputA: {self.inputA}, inputB: {self.inputB}]"
 
+    def sourceNames(self):
+        sources = []
+        if isinstance(self.inputA, list):
+            sources.extend(self.inputA)
+        if isinstance(self.inputB, list):
+            sources.extend(self.inputB)
+        return sources
+
+    def copy(self):
+        logicBlock = LogicBlock(self.name, self.function, None, None, self.separate)
+        logicBlock.inputA = self.inputA[:] if isinstance(self.inputA, list) else self.inputA
+        logicBlock.inputB = self.inputB[:] if isinstance(self.inputB, list) else self.inputB
+        logicBlock.label = self.label
+        return logicBlock
+
     def setSeparate(self, separate: bool):
         self.separate = separate
     
     def setLabel(self, text: str):
         self.label = text
-        print(f"{self.name} label set to {text}")
+        logger.debug("%s label set to %s", self.name, text)
 
     def updateInputs(self, inputA=None, inputB=None):
         if inputA != None:
             if isinstance(inputA, str):
                 if not isinstance(self.inputA, list) or len(self.inputA) == 0:
-                    self.inputA = [inputA]
+                    self.inputA = [sys.intern(inputA)]
                 else:
-                    self.inputA.append(inputA)
-            else:
+                    self.inputA.append(sys.intern(inputA))
+            elif isinstance(inputA, list):
                 self.inputA = inputA
+            else:
+                self.inputA = float(inputA)
         if inputB != None:
             if isinstance(inputB, str):
                 if not isinstance(self.inputB, list) or len(self.inputB) == 0:
-                    self.inputB = [inputB]
+                    self.inputB = [sys.intern(inputB)]
                 else:
-                    self.inputB.append(inputB)
-            else:
+                    self.inputB.append(sys.intern(inputB))
+            elif isinstance(inputB, list):
                 self.inputB = inputB
+            else:
+                self.inputB = float(inputB)
 
     def removeInputs(self, inputA=None, inputB=None):
         if inputA and isinstance(inputA, str) and isinstance(self.inputA, list):
-            print(f"removing {inputA}")
+            logger.debug("%s removing input %s", self.name, inputA)
             self.inputA.remove(inputA)
             if len(self.inputA) == 0:
-                self.inputA = 1
+                self.inputA = 1.0
         if inputB and isinstance(inputB, str) and isinstance(self.inputB, list):
-            print(f"removing {inputB}")
+            logger.debug("%s removing input %s", self.name, inputB)
             self.inputB.remove(inputB)
             if len(self.inputB) == 0:
-                self.inputB = 1
+                self.inputB = 1.0
 
 class EquationBlock:
-    def __init__(self, name, equation = None):
+    def __init__(self, name, equation = None, optimizationLevel: int = Optimizer.defaultOptimizationLevel):
         self.name = name
         self.equation = equation
+        self.optimizationLevel = optimizationLevel
         self.logicBlocks = []
         self.outputBlockName = None
         self.variableNames = []
-
-    def tokenToFunctionName(self, token: str):
-        if token in constants.tokenToFuncName.keys():
-            return constants.tokenToFuncName[token]
-        elif token in constants.logicFunctions:
-            return token
-        else:
-            return None
-
-    def isFunctionNotOperator(self, token: str):
-        return ((token not in constants.tokenToFuncName.keys()) and (token not in constants.tokenToFuncName.values())) and (token in constants.logicFunctions)
-    
-    def isOperatorNotFunction(self, token: str):
-        return (token not in constants.logicFunctions) and (token in constants.tokenToFuncName.keys())
+        self.bricksSaved = 0
+        # Index used to name the next operator block, names are never reused within an equation
+        self.nameIterator = 0
 
     def isNotFunctionOperator(self, token: str):
-        return ((token not in constants.tokenToFuncName.keys()) and (token not in constants.logicFunctions))
-
-    def manageImplicitMultipication(self, inputEquation: str):
-        splitEquation = inputEquation.split(' ')
-        outputEquation = splitEquation[0]
-        for i in range(len(splitEquation) - 1):
-            if (((splitEquation[i+1] == '(') and (splitEquation[i] != '(') and (self.isNotFunctionOperator(splitEquation[i])) and (splitEquation[i] != ",")) or 
-                ((splitEquation[i] == ')') and (splitEquation[i+1] != ')') and (self.isNotFunctionOperator(splitEquation[i+1])) and (splitEquation[i+1] != ","))):
-                outputEquation += " *"
-            outputEquation += (" " + splitEquation[i + 1])
-        return outputEquation
+        return (token not in constants.tokenToFuncName) and (token not in constants.logicFunctionSet)
+
+    def tokenize(self, inputEquation: str):
+        # Single pass lexer returning (kind, text) tokens. Spaces are optional, unary minus becomes a NEG
+        # token (or part of a number literal) and implicit multiplication inserts a "*" operator.
+        tokens = []
+        previousKind = None
+        position = 0
+        length = len(inputEquation)
+
+        while position < length:
+            match = tokenPattern.match(inputEquation, position)
+            if match is None:
+                remaining = inputEquation[position:]
+                if remaining.isspace():
+                    break
+                errorPosition = length - len(remaining.lstrip())
+                raise ValueError(f"Unexpected character '{inputEquation[errorPosition]}' at position {errorPosition} in equation")
+            position = match.end()
+
+            if match.group("number"):
+                kind, text = "number", match.group("number")
+            elif match.group("name"):
+                text = match.group("name")
+                kind = "function" if text in constants.logicFunctionSet else "name"
+            else:
+                text = match.group("symbol")
+                if text in constants.tokenToFuncName:
+                    kind = "operator"
+                    if (text in "+-") and (previousKind in (None, "operator", "unary", "(", ",")):
+                        if text == "+":
+                            continue
+                        kind = "unary"
+                else:
+                    kind = text
+
+            # 1.5.2 or 2 3 is a typo, not a product
+            if (previousKind == "number") and (kind == "number"):
+                raise ValueError(f"Unexpected number '{text}' at position {match.start('number')} in equation")
+            if (previousKind in ("number", "name", ")")) and (kind in ("number", "name", "function", "(")):
+                tokens.append(("operator", "*"))
+            # -2 is a literal, but -2 ^ 2 still means -(2 ^ 2)
+            if (kind == "number") and (previousKind == "unary") and not powerPattern.match(inputEquation, position):
+                tokens.pop()
+                text = "-" + text
+
+            tokens.append((kind, text))
+            previousKind = kind
+
+        return tokens
     
-    def shuntingYard(self, inputEquation: str):
+    def shuntingYard(self, inputEquation: str, tokens=None):
         outputQueue = []
         operatorStack = []
-        
-        removedNewlines = inputEquation.replace("\n", "").replace("\r", "")
-        modifiedEquation = self.manageImplicitMultipication(removedNewlines)
 
-        for token in modifiedEquation.split(' '):
-            if self.isOperatorNotFunction(token):
+        def popOperator():
+            operator = operatorStack.pop()
+            if operator == "NEG":
+                outputQueue.append("-1")
+                outputQueue.append("*")
+            else:
+                outputQueue.append(operator)
+
+        if tokens is None:
+            tokens = self.tokenize(inputEquation)
+
+        for kind, token in tokens:
+            if kind == "operator":
                 while((len(operatorStack) > 0) and 
-                    (operatorStack[-1] != "(") and 
+                    (operatorStack[-1] in constants.precedence) and
                     ((constants.precedence[token] < constants.precedence[operatorStack[-1]]) or ((token != "^") and (constants.precedence[token] == constants.precedence[operatorStack[-1]])))):
-                    outputQueue.append(operatorStack.pop())
+                    popOperator()
                 operatorStack.append(token)
-            elif self.isFunctionNotOperator(token):
+            elif kind == "unary":
+                operatorStack.append("NEG")
+            elif kind == "function":
                 operatorStack.append(token)
-            elif token == ",":
+            elif kind == ",":
                 while((len(operatorStack) > 0) and (operatorStack[-1] != "(")):
-                    outputQueue.append(operatorStack.pop())
-            elif token == "(":
+                    popOperator()
+            elif kind == "(":
                 operatorStack.append(token)
-            elif token == ")":
+            elif kind == ")":
                 while((len(operatorStack) > 0) and (operatorStack[-1] != "(")):
-                    outputQueue.append(operatorStack.pop())
-                if (operatorStack[-1] == "("):
-                    operatorStack.pop()
-                if ((len(operatorStack) > 0) and (self.isFunctionNotOperator(operatorStack[-1]))):
+                    popOperator()
+                if (len(operatorStack) == 0):
+                    raise ValueError("Unbalanced parentheses in equation")
+                operatorStack.pop()
+                if ((len(operatorStack) > 0) and (operatorStack[-1] in constants.logicFunctionSet)):
                     outputQueue.append(operatorStack.pop())
             else:
                 outputQueue.append(token)
 
         while (len(operatorStack) > 0):
-            outputQueue.append(operatorStack.pop())
+            if (operatorStack[-1] == "("):
+                raise ValueError("Unbalanced parentheses in equation")
+            popOperator()
         
         return outputQueue
     
     def generateLogicBlocks(self):
         if (self.equation):
-            revPolNoEq = self.shuntingYard(self.equation)
-            
-            evaluationStack = []
-
-            nameIterator = 0
-
-            print(revPolNoEq)
-            for token in revPolNoEq:
-                # variables or numbers
-                if (self.isNotFunctionOperator(token)):
-                    # variables
-                    if (isinstance(constants.makeNumberifNumber(token), str)):
-                        evaluationStack.append(self.name + token)
-                        if (not ((self.name + token) in self.variableNames)):
-                            self.variableNames.append((self.name + token))
-                            self.logicBlocks.append(LogicBlock((self.name + token), "ADD"))
-                    # numbers
-                    else:
-                        evaluationStack.append(token)
-                # Functions with one input
-                elif (token != "MIN" and token != "MAX") and self.isFunctionNotOperator(token):
-                    function = self.tokenToFunctionName(token)
-                    self.logicBlocks.append(LogicBlock((self.name + (function + str(nameIterator))), function, constants.makeNumberifNumber(evaluationStack.pop()), 0))
-                    evaluationStack.append(self.name + (function + str(nameIterator)))
-                    nameIterator += 1
-                # Functions and Operators with two inputs
-                else:
-                    function = self.tokenToFunctionName(token)
-                    opB = evaluationStack.pop()
-                    opA = evaluationStack.pop()
-                    self.logicBlocks.append(LogicBlock((self.name + (function + str(nameIterator))), function, constants.makeNumberifNumber(opA), constants.makeNumberifNumber(opB)))
-                    evaluationStack.append(self.name + (function + str(nameIterator)))
-                    nameIterator += 1
-            
-            self.logicBlocks.append(LogicBlock(self.name + "Output", "ADD", evaluationStack.pop(), 0))
-            self.outputBlockName = (self.name + "Output")
-    
+            # Re-entering the exact same text skips even the lexer
+            rawKey = (self.equation, self.optimizationLevel)
+            template = equationCache.get(rawKey)
+            if template is None:
+                tokens = self.tokenize(self.equation)
+                # Equal token streams compile to equal blocks, so spacing and newlines don't matter
+                normalizedKey = (" ".join(text for kind, text in tokens), self.optimizationLevel)
+                template = equationCache.get(normalizedKey)
+                if template is None:
+                    self.compileLogicBlocks(tokens)
+                    template = self.createTemplate()
+                    equationCache.put(normalizedKey, template)
+                    equationCache.put(rawKey, template)
+                    return
+                equationCache.put(rawKey, template)
+            self.instantiateTemplate(template)
+
+    def createTemplate(self):
+        # Blocks with the equation name stripped from every block and source name
+        prefixLength = len(self.name)
+
+        def stripOperand(operand):
+            if isinstance(operand, list):
+                return tuple(name[prefixLength:] for name in operand)
+            return operand
+
+        blockTemplates = tuple((logicBlock.name[prefixLength:], logicBlock.function, stripOperand(logicBlock.inputA), stripOperand(logicBlock.inputB)) for logicBlock in self.logicBlocks)
+        variableSuffixes = tuple(name[prefixLength:] for name in self.variableNames)
+        return (blockTemplates, variableSuffixes, self.outputBlockName[prefixLength:], self.bricksSaved)
+
+    def instantiateTemplate(self, template):
+        blockTemplates, variableSuffixes, outputSuffix, bricksSaved = template
+
+        def prefixOperand(operand):
+            if isinstance(operand, tuple):
+                return [sys.intern(self.name + suffix) for suffix in operand]
+            return operand
+
+        for suffix, function, inputA, inputB in blockTemplates:
+            logicBlock = LogicBlock(self.name + suffix, function, None, None)
+            logicBlock.inputA = prefixOperand(inputA)
+            logicBlock.inputB = prefixOperand(inputB)
+            self.logicBlocks.append(logicBlock)
+        self.variableNames = [sys.intern(self.name + suffix) for suffix in variableSuffixes]
+        self.outputBlockName = self.name + outputSuffix
+        self.bricksSaved = bricksSaved
+        self.nameIterator = len(blockTemplates) - len(variableSuffixes) - 1
+
+    def compileLogicBlocks(self, tokens):
+        revPolNoEq = self.shuntingYard(self.equation, tokens)
+
+        # Variables get their blocks up front so optimizing one away doesn't remove its input
+        for token in revPolNoEq:
+            if self.isNotFunctionOperator(token) and isinstance(constants.makeNumberifNumber(token), str):
+                if (not ((self.name + token) in self.variableNames)):
+                    self.variableNames.append((self.name + token))
+                    self.logicBlocks.append(LogicBlock((self.name + token), "ADD"))
+
+        tree = Optimizer.optimizeExpressionTree(Optimizer.buildExpressionTree(revPolNoEq), self.optimizationLevel)
+        logger.debug("%s compiled to %s", self.name, tree)
+
+        # subexpression key -> name of the block that already computes it
+        subexpressions = {}
+        # id of tree node -> block name, constant, or list of block names summed in whichever channel reads it
+        values = {}
+
+        self.nameIterator = 0
+
+        # Iterative post order walk, children are compiled before the blocks that read them
+        stack = [(tree, False)]
+        while stack:
+            node, childrenDone = stack.pop()
+            # variables or numbers
+            if not isinstance(node, tuple):
+                values[id(node)] = (self.name + node) if isinstance(node, str) else node
+                continue
+            if not childrenDone:
+                stack.append((node, True))
+                for child in reversed(node[1]):
+                    stack.append((child, False))
+                continue
+
+            function = node[0]
+            operands = [values[id(child)] for child in node[1]]
+            if (function == "ADD") and (self.optimizationLevel >= 2):
+                opA, opB = self.sumChannels(operands, subexpressions)
+                # A sum of distinct blocks doesn't need a brick, it's wired straight into its reader
+                if opB == 0 and isinstance(opA, list):
+                    values[id(node)] = opA
+                    continue
+            elif len(operands) == 1:
+                opA = operands[0]
+                opB = 0
+            else:
+                opA, opB = operands
+
+            values[id(node)] = self.addCompiledBlock(function, opA, opB, subexpressions)
+
+        self.logicBlocks.append(LogicBlock(self.name + "Output", "ADD", self.channelInput(values[id(tree)]), 0))
+        self.outputBlockName = (self.name + "Output")
+
+    def channelInput(self, value):
+        # Lists are shared between the blocks reading a sum, every block gets its own copy
+        if isinstance(value, list):
+            return value[:]
+        return value
+
+    def sumChannels(self, operands, subexpressions):
+        # Splits the operands of an ADD node between the two inputs. Each channel sums its sources,
+        # so distinct blocks go into input A and repeated blocks or a constant into input B.
+        channelA = []
+        channelB = []
+        namesA = set()
+        constant = None
+        for operand in operands:
+            if isinstance(operand, list):
+                for name in operand:
+                    (channelB if name in namesA else channelA).append(name)
+                    namesA.add(name)
+            elif isinstance(operand, str):
+                (channelB if operand in namesA else channelA).append(operand)
+                namesA.add(operand)
+            else:
+                constant = operand if constant is None else constant + operand
+        if len(channelA) == 0:
+            return (constant, 0)
+        if len(channelB) == 0:
+            return (channelA, 0 if constant is None else constant)
+        if constant is not None:
+            # Only one of the repeated blocks and the constant fit in input B
+            channelB = [self.addCompiledBlock("ADD", channelB, constant, subexpressions)]
+        return (channelA, channelB)
+
+    def addCompiledBlock(self, function, opA, opB, subexpressions):
+        key = subexpressionKey(function, opA, opB)
+        if key in subexpressions:
+            self.bricksSaved += 1
+            return subexpressions[key]
+        blockName = self.name + (function + str(self.nameIterator))
+        self.logicBlocks.append(LogicBlock(blockName, function, self.channelInput(opA), self.channelInput(opB)))
+        subexpressions[key] = blockName
+        self.nameIterator += 1
+        return blockName
+
     def updateEquation(self, equation):
+        # Recompiles the equation, keeping every block (with its name, settings and wired inputs) whose
+        # subtree didn't change. Returns the (added, removed) blocks.
+        oldBlocks = self.logicBlocks
+        oldVariableNames = set(self.variableNames)
+        oldOutputName = self.outputBlockName
+
+        newEquationBlock = EquationBlock(self.name, equation, self.optimizationLevel)
+        newEquationBlock.generateLogicBlocks()
+
         self.equation = equation
+        self.bricksSaved = newEquationBlock.bricksSaved
+
+        if (oldOutputName is None) or (newEquationBlock.outputBlockName is None):
+            self.logicBlocks = newEquationBlock.logicBlocks
+            self.variableNames = newEquationBlock.variableNames
+            self.outputBlockName = newEquationBlock.outputBlockName
+            self.nameIterator = newEquationBlock.nameIterator
+            return (self.logicBlocks[:], oldBlocks)
+
+        # Structure keys are interned to ints so comparing deep subtrees stays O(1)
+        structureIds = {}
+        prefixLength = len(self.name)
+
+        def structureId(logicBlock: LogicBlock, blockIds: dict, variableNames):
+            if logicBlock.name in variableNames:
+                key = ("variable", logicBlock.name[prefixLength:])
+            else:
+                def operandKey(operand):
+                    if isinstance(operand, list):
+                        return ["#" + str(blockIds[name]) for name in operand]
+                    return operand
+                key = subexpressionKey(logicBlock.function, operandKey(logicBlock.inputA), operandKey(logicBlock.inputB))
+            return structureIds.setdefault(key, len(structureIds))
+
+        oldBlockIds = {}
+        oldBlocksById = {}
+        for logicBlock in oldBlocks:
+            if logicBlock.name != oldOutputName:
+                blockId = structureId(logicBlock, oldBlockIds, oldVariableNames)
+                oldBlockIds[logicBlock.name] = blockId
+                oldBlocksById[blockId] = logicBlock
+
+        newVariableNames = set(newEquationBlock.variableNames)
+        newBlockIds = {}
+        finalNames = {}
         self.logicBlocks = []
-        self.variableNames = []
-        self.generateLogicBlocks()
+        addedBlocks = []
+
+        def renameOperand(operand):
+            if isinstance(operand, list):
+                return [finalNames[name] for name in operand]
+            return operand
+
+        for logicBlock in newEquationBlock.logicBlocks:
+            if logicBlock.name == newEquationBlock.outputBlockName:
+                continue
+            blockId = structureId(logicBlock, newBlockIds, newVariableNames)
+            newBlockIds[logicBlock.name] = blockId
+            if blockId in oldBlocksById:
+                keptBlock = oldBlocksById.pop(blockId)
+                finalNames[logicBlock.name] = keptBlock.name
+                self.logicBlocks.append(keptBlock)
+            else:
+                compiledName = logicBlock.name
+                if compiledName not in newVariableNames:
+                    logicBlock.name = sys.intern(self.name + logicBlock.function + str(self.nameIterator))
+                    self.nameIterator += 1
+                finalNames[compiledName] = logicBlock.name
+                logicBlock.inputA = renameOperand(logicBlock.inputA)
+                logicBlock.inputB = renameOperand(logicBlock.inputB)
+                self.logicBlocks.append(logicBlock)
+                addedBlocks.append(logicBlock)
+
+        # The output block keeps its name so everything wired to it stays connected
+        outputBlock = next(logicBlock for logicBlock in oldBlocks if logicBlock.name == oldOutputName)
+        newOutputBlock = next(logicBlock for logicBlock in newEquationBlock.logicBlocks if logicBlock.name == newEquationBlock.outputBlockName)
+        outputBlock.inputA = renameOperand(newOutputBlock.inputA)
+        self.logicBlocks.append(outputBlock)
+
+        self.variableNames = [finalNames[name] for name in newEquationBlock.variableNames]
+        return (addedBlocks, list(oldBlocksById.values()))
 
 class LogicData:
     def __init__(self):
@@ -176,6 +488,7 @@ class LogicData:
         self.numOfEachFunction = {}
         self.logicData = {}
         self.equationBlocks = {}
+        self.optimizationLevel = Optimizer.defaultOptimizationLevel
         
     def generateUniqueName(self, name):
         if name in self.numOfEachFunction.keys():
@@ -185,11 +498,12 @@ class LogicData:
         return name + str(self.numOfEachFunction[name])
         
     def printLogicData(self):
-        print("--------------------------------------")
-        printable_dict = {k: str(v) for k, v in self.logicData.items()}
-        pprint.pprint(printable_dict)
+        # Debug dump of the whole design, only formatted when debug logging is enabled
+        if logger.isEnabledFor(logging.DEBUG):
+            printable_dict = {k: str(v) for k, v in self.logicData.items()}
+            logger.debug("Logic data:\n%s", pprint.pformat(printable_dict))
     
-    def addLogicBlock(self, function, inputA=0, inputB=0):
+    def addLogicBlock(self, function, inputA=0.0, inputB=0.0):
         name = self.generateUniqueName(function)
         logicBlock = LogicBlock(name, function, inputA, inputB)
         self.logicData[name] = logicBlock
@@ -219,10 +533,32 @@ class LogicData:
     def setLogicLabel(self, name, text: str):
         self.logicData[name].setLabel(text)
 
+    def interfaceBlockNames(self):
+        # Blocks the user placed or can wire to: components, equation variables and equation outputs
+        equationInternalNames = set()
+        equationBlock: EquationBlock
+        for equationBlock in self.equationBlocks.values():
+            equationInternalNames.update(logicBlock.name for logicBlock in equationBlock.logicBlocks)
+            equationInternalNames.difference_update(equationBlock.variableNames)
+            equationInternalNames.discard(equationBlock.outputBlockName)
+        return [name for name in self.logicData if name not in equationInternalNames]
+
+    def outputBlockNames(self):
+        # Blocks a creation is built for: separate or labelled blocks, equation outputs nothing reads from
+        # and any other block nothing reads from that has a wired input
+        readNames = set()
+        logicBlock: LogicBlock
+        for logicBlock in self.logicData.values():
+            readNames.update(logicBlock.sourceNames())
+        equationOutputNames = set(equationBlock.outputBlockName for equationBlock in self.equationBlocks.values())
+        return [logicBlock.name for logicBlock in self.logicData.values()
+            if logicBlock.separate or logicBlock.label
+            or ((logicBlock.name not in readNames) and ((logicBlock.name in equationOutputNames) or logicBlock.sourceNames()))]
+
     def addEquationBlock(self, equation: str = None):
-        equationBlock = EquationBlock(self.generateUniqueName("EQN"), equation)
-        self.equationBlocks[equationBlock.name] = equationBlock
+        equationBlock = EquationBlock(self.generateUniqueName("EQN"), equation, self.optimizationLevel)
         equationBlock.generateLogicBlocks()
+        self.equationBlocks[equationBlock.name] = equationBlock
         logicBlock: LogicBlock
         for logicBlock in equationBlock.logicBlocks:
             self.logicData[logicBlock.name] = logicBlock
@@ -242,27 +578,199 @@ class LogicData:
 
     def updateEquationBlock(self, name, equation):
         equationBlock: EquationBlock = self.equationBlocks[name]
-        # Remove related equation blocks
+        # Only the blocks whose part of the equation changed are touched
+        addedBlocks, removedBlocks = equationBlock.updateEquation(equation)
         logicBlock: LogicBlock
-        for logicBlock in equationBlock.logicBlocks:
+        for logicBlock in removedBlocks:
             del self.logicData[logicBlock.name]
-        # update equation block equation
-        equationBlock.updateEquation(equation)
-        # re-add equation blocks
-        for logicBlock in equationBlock.logicBlocks:
+        for logicBlock in addedBlocks:
             self.logicData[logicBlock.name] = logicBlock
         return equationBlock
         
 
 
+def topologicalOrder(logicData: dict, sortedNames: bool=False):
+    # Iterative depth first search, so long equation chains can't hit the recursion limit.
+    # Returns every block in logicData with each block placed after all of its sources.
+    # With sortedNames the order only depends on the blocks, not on the order they were added or wired in.
+    order = []
+    visiting = set()
+    visited = set()
+
+    def sourcesOf(name):
+        sourceNames = logicData[name].sourceNames()
+        return iter(sorted(sourceNames) if sortedNames else sourceNames)
+
+    for rootName in (sorted(logicData) if sortedNames else logicData):
+        if rootName in visited:
+            continue
+        visiting.add(rootName)
+        stack = [(rootName, sourcesOf(rootName))]
+        while stack:
+            name, sources = stack[-1]
+            for sourceName in sources:
+                # Sources that were removed from the design are not part of the graph
+                if (sourceName in visited) or (sourceName not in logicData):
+                    continue
+                if sourceName in visiting:
+                    path = [entry[0] for entry in stack]
+                    raise LogicCycleError(path[path.index(sourceName):] + [sourceName])
+                visiting.add(sourceName)
+                stack.append((sourceName, sourcesOf(sourceName)))
+                break
+            else:
+                stack.pop()
+                visiting.discard(name)
+                visited.add(name)
+                order.append(logicData[name])
+
+    return order
+
+def eliminateCommonSubexpressions(logicData: dict, keepNames=()):
+    # Merges blocks that compute the same function of the same inputs across the whole design,
+    # e.g. identical terms in different equations. Blocks in keepNames are never merged away.
+    # Works on copies so the design itself is untouched.
+    # Returns the optimized blocks and a {removed block name: kept block name} report.
+    keepNames = set(keepNames)
+    optimizedData = {}
+    replacements = {}
+    subexpressions = {}
+
+    logicBlock: LogicBlock
+    for logicBlock in topologicalOrder(logicData):
+        optimizedBlock = logicBlock.copy()
+        if isinstance(optimizedBlock.inputA, list):
+            optimizedBlock.inputA = [replacements.get(name, name) for name in optimizedBlock.inputA]
+        if isinstance(optimizedBlock.inputB, list):
+            optimizedBlock.inputB = [replacements.get(name, name) for name in optimizedBlock.inputB]
+
+        key = subexpressionKey(optimizedBlock.function, optimizedBlock.inputA, optimizedBlock.inputB)
+        # Separate blocks are kept so they still show up in game
+        if (key in subexpressions) and not (optimizedBlock.separate or (optimizedBlock.name in keepNames)):
+            replacements[optimizedBlock.name] = subexpressions[key]
+        else:
+            subexpressions.setdefault(key, optimizedBlock.name)
+            optimizedData[optimizedBlock.name] = optimizedBlock
+
+    return optimizedData, replacements
+
+def pruneLogicData(logicData: dict, outputNames):
+    # Removes the blocks the outputs don't depend on, e.g. unconnected components or equation variables
+    # that were optimized away, and wires around pass-through ADD x + 0 blocks by connecting their sources
+    # straight to the blocks reading them. Output and separate blocks are always kept, as are blocks
+    # without wired inputs, which are where sensors get wired in game.
+    # Works on copies so the design itself is untouched.
+    # Returns the pruned blocks and a {removed block name: reason} report.
+    outputNames = set(outputNames)
+    prunedData = {}
+    # name -> sources of a pass-through block
+    passThroughSources = {}
+
+    def resolveChannel(channel):
+        if not isinstance(channel, list):
+            return channel
+        names = [name for name in channel if name not in passThroughSources]
+        wiredNames = set(names)
+        for name in channel:
+            if name in passThroughSources:
+                sources = passThroughSources[name]
+                # A block can only be wired into a channel once
+                if wiredNames.isdisjoint(sources):
+                    names.extend(sources)
+                    wiredNames.update(sources)
+                else:
+                    names.append(name)
+                    wiredNames.add(name)
+        return names
+
+    logicBlock: LogicBlock
+    for logicBlock in topologicalOrder(logicData):
+        prunedBlock = logicBlock.copy()
+        prunedBlock.inputA = resolveChannel(prunedBlock.inputA)
+        prunedBlock.inputB = resolveChannel(prunedBlock.inputB)
+        prunedData[prunedBlock.name] = prunedBlock
+
+        if (prunedBlock.name in outputNames) or prunedBlock.separate or (prunedBlock.function != "ADD"):
+            continue
+        if isinstance(prunedBlock.inputA, list) and (prunedBlock.inputB == 0):
+            passThroughSources[prunedBlock.name] = prunedBlock.inputA
+        elif isinstance(prunedBlock.inputB, list) and (prunedBlock.inputA == 0):
+            passThroughSources[prunedBlock.name] = prunedBlock.inputB
+
+    # Keep what the outputs still read from
+    reachableNames = set()
+    stack = [name for name in outputNames if name in prunedData]
+    while stack:
+        name = stack.pop()
+        if name in reachableNames:
+            continue
+        reachableNames.add(name)
+        stack.extend(sourceName for sourceName in prunedData[name].sourceNames() if sourceName in prunedData)
+
+    removed = {}
+    for name in list(prunedData):
+        if name not in reachableNames:
+            del prunedData[name]
+            removed[name] = "pass-through" if name in passThroughSources else "unreachable"
+
+    return prunedData, removed
+
+def nameColor(name: str, palette=None):
+    # Color derived from a stable hash of the name (Python's hash() changes between runs), either an
+    # entry of palette, a list of [r, g, b, a] colors, or an opaque color made from the hash itself
+    hashValue = zlib.crc32(name.encode("utf-8"))
+    if palette:
+        return list(palette[hashValue % len(palette)])
+    return [hashValue & 255, (hashValue >> 8) & 255, (hashValue >> 16) & 255, 255]
+
+# Part of every export fingerprint, bump it whenever LogicExporter writes different bricks for the same design
+exportFormatVersion = 3
+
 class LogicExporter:
-    def __init__(self, logicData: LogicData):
+    def __init__(self, logicData: LogicData, shareSubexpressions: bool=False, prune: bool=False, placement: Placement.BrickPlacement=None, palette: list=None, cache: ExportCache.ExportCache=None):
         self.logicData = logicData
-        self.convertedBlocks = []
-        self.x = 10
-        self.y = 0
-    
-    def generateMathBrick(self, creation: BRCI.ModernCreation, brickName: str, operation: str, inputA: float | list = 1, inputB: float | list = 1, x = 0, y = 0, z = 0, color = [0, 0, 127, 255]):
+        self.shareSubexpressions = shareSubexpressions
+        self.prune = prune
+        self.placement = placement if placement is not None else Placement.BrickPlacement()
+        self.palette = palette
+        self.cache = cache
+
+    def resolveProjectDir(self, projectDir: str=None):
+        if projectDir:
+            return projectDir
+        if BRCI is None:
+            raise RuntimeError("BRCI is required to write .brv creations")
+        return BRCI.ModernCreation.get_brick_rigs_vehicle_folder()
+
+    def createCreation(self, name: str, projectDir: str=None):
+        if BRCI is None:
+            raise RuntimeError("BRCI is required to write .brv creations")
+        return BRCI.Creation14(
+            project_name=name,
+            project_dir=self.resolveProjectDir(projectDir)
+        )
+
+    def fingerprintRecords(self, name: str):
+        # Everything that changes the written creation, blocks in name order with sorted channels
+        def channelRecord(channel):
+            return sorted(channel) if isinstance(channel, list) else float(channel)
+
+        # A LogiBrick or BRCI upgrade can change the written files even if the design didn't change
+        yield ["exporter", exportFormatVersion, getattr(BRCI, "__version__", None)]
+        yield ["options", name, self.shareSubexpressions, self.prune, self.palette, sorted(vars(self.placement).items())]
+        if self.shareSubexpressions:
+            yield ["interface", sorted(self.logicData.interfaceBlockNames())]
+        if self.prune:
+            yield ["outputs", sorted(self.logicData.outputBlockNames())]
+        for blockName in sorted(self.logicData.logicData):
+            logicBlock: LogicBlock = self.logicData.logicData[blockName]
+            yield [blockName, logicBlock.function, channelRecord(logicBlock.inputA), channelRecord(logicBlock.inputB), logicBlock.separate, logicBlock.label]
+
+    def fingerprint(self, name: str="generated"):
+        return (self.cache if self.cache is not None else ExportCache.ExportCache()).fingerprint(self.fingerprintRecords(name))
+
+    def generateMathBrick(self, creation: "BRCI.ModernCreation", brickName: str, operation: str, inputA: float | list = 1, inputB: float | list = 1, x = 0, y = 0, z = 0, color = [0, 0, 127, 255]):
+        # Channels sum their sources, sorting them keeps equal designs byte identical
         creation.add_brick(
             'MathBrick_1sx1sx1s',
             brickName,
@@ -272,15 +780,15 @@ class LogicExporter:
                 "BrickColor": color,
                 "Operation": operation,
                 "InputChannelA.InputAxis" : ("Custom" if isinstance(inputA, list) else "AlwaysOn"),
-                "InputChannelA.SourceBricks": (inputA if isinstance(inputA, list) else []),
+                "InputChannelA.SourceBricks": (sorted(inputA) if isinstance(inputA, list) else []),
                 "InputChannelA.Value": (inputA if isinstance(inputA, (int, float)) else 1),
                 "InputChannelB.InputAxis" : ("Custom" if isinstance(inputB, list) else "AlwaysOn"),
-                "InputChannelB.SourceBricks": (inputB if isinstance(inputB, list) else []),
+                "InputChannelB.SourceBricks": (sorted(inputB) if isinstance(inputB, list) else []),
                 "InputChannelB.Value": (inputB if isinstance(inputB, (int, float)) else 1)
             }
         )
     
-    def generateTextBrick(self, creation: BRCI.ModernCreation, brickName: str, text: str, x = 0, y = 0, z = 0, xrot = 0, yrot = 0, zrot = 0, color = [0, 0, 127, 255]):
+    def generateTextBrick(self, creation: "BRCI.ModernCreation", brickName: str, text: str, x = 0, y = 0, z = 0, xrot = 0, yrot = 0, zrot = 0, color = [0, 0, 127, 255]):
         creation.add_brick(
             'TextBrick',
             brickName,
@@ -293,52 +801,60 @@ class LogicExporter:
             }
         )
     
-    def returnAndIncrementCoordinates(self):
-        oldXY = (self.x, self.y)
-        self.x += 10
-        if self.x == 110:
-            self.x = 0
-            self.y += 10
-        return oldXY
-
-    def convertLogicBlock(self, logicBlock: LogicBlock, creation: BRCI.ModernCreation, defaultColor=[0, 0, 127, 255]):
-        if (logicBlock.name not in self.convertedBlocks):
-            if (isinstance(logicBlock.inputA, list)):
-                for blockName in logicBlock.inputA:
-                    self.convertLogicBlock(self.logicData[blockName], creation)
-            if (isinstance(logicBlock.inputB, list)):
-                for blockName in logicBlock.inputB:
-                    self.convertLogicBlock(self.logicData[blockName], creation)
-            if (logicBlock.separate):
-                coordinates = self.returnAndIncrementCoordinates()
-                randomColor = [random.randint(0, 255), random.randint(0, 255), random.randint(0, 255), 255]
-                self.generateMathBrick(creation, logicBlock.name, constants.functionToBRName[logicBlock.function], logicBlock.inputA, logicBlock.inputB, x=coordinates[0], y=coordinates[1], z=0, color=randomColor)
-                if (logicBlock.label != ""):
-                    self.generateTextBrick(creation, (logicBlock.name + "TEXT"), logicBlock.label, x=coordinates[0], y=coordinates[1], z=6, zrot = -90, color=randomColor)
-                else:
-                    self.generateTextBrick(creation, (logicBlock.name + "TEXT"), logicBlock.name, x=coordinates[0], y=coordinates[1], z=6, zrot = -90, color=randomColor)
+    def convertLogicBlock(self, logicBlock: LogicBlock, creation: "BRCI.ModernCreation", position=(0, 0, 0), defaultColor=[0, 0, 127, 255]):
+        x, y, z = position
+        if (logicBlock.separate):
+            blockColor = nameColor(logicBlock.name, self.palette)
+            self.generateMathBrick(creation, logicBlock.name, constants.functionToBRName[logicBlock.function], logicBlock.inputA, logicBlock.inputB, x=x, y=y, z=z, color=blockColor)
+            labelX, labelY, labelZ = self.placement.labelPosition(position)
+            if (logicBlock.label != ""):
+                self.generateTextBrick(creation, (logicBlock.name + "TEXT"), logicBlock.label, x=labelX, y=labelY, z=labelZ, zrot = -90, color=blockColor)
             else:
-                self.generateMathBrick(creation, logicBlock.name, constants.functionToBRName[logicBlock.function], logicBlock.inputA, logicBlock.inputB, x=0, y=0, z=0, color=defaultColor)
-                
-            self.convertedBlocks.append(logicBlock.name)
-
-    def convertLogicDataToCreation(self, name: str="generated"):
-        creation: BRCI.ModernCreation = BRCI.Creation14(
-            project_name=name,
-            project_dir=BRCI.ModernCreation.get_brick_rigs_vehicle_folder()
-        )
-
-        randomColor = [random.randint(0, 255), random.randint(0, 255), random.randint(0, 255), random.randint(0, 255)]
-
-        for block in self.logicData.values():
-            if (block not in self.convertedBlocks):
-                self.convertLogicBlock(block, creation, defaultColor=randomColor)
-        print("Logic Converted")
-        self.convertedBlocks = []
-        self.x = 10
-        self.y = 0
+                self.generateTextBrick(creation, (logicBlock.name + "TEXT"), logicBlock.name, x=labelX, y=labelY, z=labelZ, zrot = -90, color=blockColor)
+        else:
+            self.generateMathBrick(creation, logicBlock.name, constants.functionToBRName[logicBlock.function], logicBlock.inputA, logicBlock.inputB, x=x, y=y, z=z, color=defaultColor)
+
+    def convertLogicDataToCreation(self, name: str="generated", projectDir: str=None):
+        # Returns a {removed block name: reason} report of the bricks pruning left out
+        if self.cache is not None:
+            fingerprint = self.fingerprint(name)
+            creationDir = os.path.join(self.resolveProjectDir(projectDir), name)
+            marker = self.cache.isCurrent(creationDir, fingerprint)
+            if marker is not None:
+                logger.info("Creation %s is unchanged", name)
+                return marker.get("removed", {})
+            marker = self.cache.restore(fingerprint, creationDir)
+            if marker is not None:
+                logger.info("Creation %s copied from the export cache", name)
+                return marker.get("removed", {})
+
+        creation = self.createCreation(name, projectDir)
+
+        # Bricks that aren't separate share one color per creation
+        creationColor = nameColor(name, self.palette)
+
+        exportData = self.logicData.logicData
+        if self.shareSubexpressions:
+            exportData, replacements = eliminateCommonSubexpressions(exportData, self.logicData.interfaceBlockNames())
+            logger.info("Shared %d duplicate bricks", len(replacements))
+
+        removed = {}
+        if self.prune:
+            exportData, removed = pruneLogicData(exportData, self.logicData.outputBlockNames())
+            for reason in ("unreachable", "pass-through"):
+                logger.info("Pruned %d %s bricks", sum(1 for removedReason in removed.values() if removedReason == reason), reason)
+            logger.debug("Pruned %s", removed)
+
+        # Sources are always emitted before the bricks that read from them
+        orderedBlocks = topologicalOrder(exportData, sortedNames=True)
+        positions = self.placement.place(orderedBlocks)
+        for block in orderedBlocks:
+            self.convertLogicBlock(block, creation, positions[block.name], defaultColor=creationColor)
+        logger.info("Logic converted")
 
         creation.write_creation(exist_ok=True)
         creation.write_metadata(exist_ok=True)
-        print("Creation Written")
-        
\ No newline at end of file
+        logger.info("Creation %s written", name)
+        if self.cache is not None:
+            self.cache.store(fingerprint, creationDir, removed)
+        return removed
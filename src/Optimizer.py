@@ -0,0 +1,272 @@
+import heapq
+import math
+
+import constants
+
+# Optimizations applied to an equation between shuntingYard and LogicBlock creation.
+#
+# Expressions are trees of floats (numbers), strings (variables) and (function, (children...)) tuples.
+# Optimization levels:
+#   0 - none, every operator becomes a brick
+#   1 - fold constant subtrees and apply identities that never change the result (x + 0, x * 1, x ^ 1, x ^ 0)
+#   2 - also strength reduce (x ^ 2 to x * x, x ^ 0.5 to SQRT, x / c to x * 1/c) and combine
+#       constants in ADD/MULT chains, which can change the last bits of the result
+#
+# Chains of MIN/MAX (from level 1) and ADD/MULT (from level 2) are rebalanced so every operand passes
+# through as few bricks (ticks) as possible. At level 2 a whole sum becomes a single n-ary ADD node,
+# since wired channels sum their sources and one brick can add any number of them.
+
+defaultOptimizationLevel = 1
+
+# Lowest optimization level each chain function is rebalanced at
+balanceLevels = {"MIN": 1, "MAX": 1, "ADD": 2, "MULT": 2}
+
+def fmod(a, b):
+    # The game returns 0 instead of NaN when dividing by (almost) zero
+    return 0.0 if constants.isFmodZeroDivisor(b) else math.fmod(a, b)
+
+def roundHalfAwayFromZero(a):
+    return math.copysign(math.floor(abs(a) + 0.5), a)
+
+foldFunctions = {
+    "ADD": lambda a, b: a + b,
+    "SUB": lambda a, b: a - b,
+    "MULT": lambda a, b: a * b,
+    "DIV": lambda a, b: a / b,
+    "MOD": fmod,
+    "POWER": lambda a, b: math.pow(a, b),
+    "GREATER": lambda a, b: 1.0 if a > b else 0.0,
+    "LESS": lambda a, b: 1.0 if a < b else 0.0,
+    "MIN": lambda a, b: min(a, b),
+    "MAX": lambda a, b: max(a, b),
+    "ABS": lambda a, b: abs(a),
+    "SIGN": lambda a, b: float((a > 0) - (a < 0)),
+    "ROUND": lambda a, b: roundHalfAwayFromZero(a),
+    "CEIL": lambda a, b: float(math.ceil(a)),
+    "FLOOR": lambda a, b: float(math.floor(a)),
+    "SQRT": lambda a, b: math.sqrt(a),
+    "dSIN": lambda a, b: math.sin(math.radians(a)),
+    "dCOS": lambda a, b: math.cos(math.radians(a)),
+    "dTAN": lambda a, b: math.tan(math.radians(a)),
+    "dASIN": lambda a, b: math.degrees(math.asin(a)),
+    "dACOS": lambda a, b: math.degrees(math.acos(a)),
+    "dATAN": lambda a, b: math.degrees(math.atan(a)),
+    "rSIN": lambda a, b: math.sin(a),
+    "rCOS": lambda a, b: math.cos(a),
+    "rTAN": lambda a, b: math.tan(a),
+    "rASIN": lambda a, b: math.asin(a),
+    "rACOS": lambda a, b: math.acos(a),
+    "rATAN": lambda a, b: math.atan(a)
+}
+
+def tokenToFunction(token: str):
+    if token in constants.tokenToFuncName:
+        return constants.tokenToFuncName[token]
+    elif token in constants.logicFunctions:
+        return token
+    return None
+
+def isConstant(node):
+    return isinstance(node, float)
+
+def buildExpressionTree(revPolNoEq: list):
+    # Raises ValueError for operators or functions missing an operand and for operands left over
+    stack = []
+    for token in revPolNoEq:
+        function = tokenToFunction(token)
+        if function is None:
+            stack.append(constants.makeNumberifNumber(token))
+            continue
+        inputCount = 2 if (function in constants.functionsWithTwoInputs) else 1
+        if len(stack) < inputCount:
+            if token == function:
+                raise ValueError(f"{function} takes {inputCount} argument{'s' if inputCount > 1 else ''}")
+            raise ValueError(f"Missing operand for '{token}' in equation")
+        if inputCount == 2:
+            opB = stack.pop()
+            opA = stack.pop()
+            stack.append((function, (opA, opB)))
+        else:
+            stack.append((function, (stack.pop(),)))
+    if len(stack) == 0:
+        raise ValueError("Equation is empty")
+    if len(stack) > 1:
+        raise ValueError("Equation has more operands or arguments than its operators and functions take")
+    return stack.pop()
+
+def foldConstant(function, operands):
+    # Returns the folded value, or None if the game would produce something we can't represent as a constant
+    try:
+        value = foldFunctions[function](operands[0], operands[1] if len(operands) > 1 else 0.0)
+    except (ValueError, ZeroDivisionError, OverflowError):
+        return None
+    return float(value) if math.isfinite(value) else None
+
+def flattenChain(function, node):
+    # Collects the operands of a chain of one associative function, e.g. a + (b + c) + d
+    operands = []
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, tuple) and current[0] == function:
+            stack.extend(reversed(current[1]))
+        else:
+            operands.append(current)
+    return operands
+
+def simplifyNode(function, operands, level):
+    if all(isConstant(operand) for operand in operands):
+        folded = foldConstant(function, operands)
+        if folded is not None:
+            return folded
+
+    if len(operands) == 2:
+        opA, opB = operands
+        if (function == "ADD") and (opA == 0.0) and not isConstant(opB):
+            return opB
+        if (function in ("ADD", "SUB")) and (opB == 0.0) and not isConstant(opA):
+            return opA
+        if (function == "MULT") and (opA == 1.0) and not isConstant(opB):
+            return opB
+        if (function in ("MULT", "DIV", "POWER")) and (opB == 1.0) and not isConstant(opA):
+            return opA
+        if (function == "POWER") and (opB == 0.0):
+            return 1.0
+
+        if level >= 2:
+            if (function == "POWER") and (opB == 2.0):
+                return ("MULT", (opA, opA))
+            if (function == "POWER") and (opB == 0.5):
+                return ("SQRT", (opA,))
+            if (function == "DIV") and isConstant(opB) and not isConstant(opA):
+                reciprocal = foldConstant("DIV", (1.0, opB))
+                if reciprocal is not None and reciprocal != 0.0:
+                    return simplifyNode("MULT", (opA, reciprocal), level)
+
+    return (function, tuple(operands))
+
+def combineChainConstants(function, operands, depths):
+    # x * 3 * y * 4 becomes x * y * 12, the combined constant is placed last
+    combined = None
+    variableOperands = []
+    variableDepths = []
+    for operand, depth in zip(operands, depths):
+        if isConstant(operand):
+            combined = operand if combined is None else foldConstant(function, (combined, operand))
+            if combined is None:
+                return operands, depths
+        else:
+            variableOperands.append(operand)
+            variableDepths.append(depth)
+    if (combined is None) or ((combined == 1.0) and (function == "MULT") and variableOperands):
+        return variableOperands, variableDepths
+    return variableOperands + [combined], variableDepths + [0]
+
+def optimizeExpressionTree(tree, level: int = defaultOptimizationLevel):
+    if level <= 0:
+        return tree
+
+    # Iterative post order walk so very long equations don't hit the recursion limit
+    results = {}
+    stack = [(tree, False)]
+    while stack:
+        node, childrenDone = stack.pop()
+        if not isinstance(node, tuple):
+            results[id(node)] = node
+            continue
+        if not childrenDone:
+            stack.append((node, True))
+            for child in node[1]:
+                stack.append((child, False))
+            continue
+
+        operands = tuple(results[id(child)] for child in node[1])
+        results[id(node)] = simplifyNode(node[0], operands, level)
+
+    return reduceTreeHeight(results[id(tree)], level)
+
+def balanceChain(function, operands, depths, level):
+    # Combines the two shallowest operands until one is left, which gives the lowest possible tree
+    heap = [(depth, index, operand) for index, (operand, depth) in enumerate(zip(operands, depths))]
+    heapq.heapify(heap)
+    counter = len(heap)
+    while len(heap) > 1:
+        depthA, _, opA = heapq.heappop(heap)
+        depthB, _, opB = heapq.heappop(heap)
+        combined = simplifyNode(function, (opA, opB), level)
+        heapq.heappush(heap, ((max(depthA, depthB) + 1) if isinstance(combined, tuple) else 0, counter, combined))
+        counter += 1
+    return heap[0][2], heap[0][0]
+
+def sumChain(operands, depths):
+    # One brick sums every distinct term wired into input A and a constant (or the second copy of
+    # repeated terms) in input B. Terms repeated more often are multiplied instead.
+    constant = 0.0
+    counts = {}
+    termDepths = {}
+    for operand, depth in zip(operands, depths):
+        if isConstant(operand):
+            constant = foldConstant("ADD", (constant, operand))
+            if constant is None:
+                return None
+        else:
+            counts[operand] = counts.get(operand, 0) + 1
+            termDepths[operand] = depth
+
+    terms = []
+    depth = 0
+    for term, count in counts.items():
+        termDepth = termDepths[term]
+        if count > 2 or (count == 2 and constant != 0.0):
+            term = ("MULT", (term, float(count)))
+            termDepth += 1
+        else:
+            terms.extend([term] * (count - 1))
+        terms.append(term)
+        depth = max(depth, termDepth)
+
+    if constant != 0.0:
+        terms.append(constant)
+    if len(terms) == 0:
+        return constant, 0
+    if len(terms) == 1:
+        return terms[0], depth
+    return ("ADD", tuple(terms)), depth + 1
+
+def reduceTreeHeight(tree, level: int = defaultOptimizationLevel):
+    # Rebuilds every chain of one balanced function with the operands of the whole chain, which is also
+    # where chain constants are combined. Chains are flattened from their root only, so each node is visited once.
+    results = {}
+    stack = [(tree, None)]
+    while stack:
+        node, operands = stack.pop()
+        if not isinstance(node, tuple):
+            results[id(node)] = (node, 0)
+            continue
+        function = node[0]
+        if operands is None:
+            if balanceLevels.get(function, level + 1) <= level:
+                operands = flattenChain(function, node)
+            else:
+                operands = node[1]
+            stack.append((node, operands))
+            for operand in operands:
+                stack.append((operand, None))
+            continue
+
+        reduced = [results[id(operand)] for operand in operands]
+        newOperands = [operand for operand, depth in reduced]
+        depths = [depth for operand, depth in reduced]
+        result = None
+        if balanceLevels.get(function, level + 1) <= level:
+            if function == "ADD":
+                result = sumChain(newOperands, depths)
+            elif function == "MULT":
+                newOperands, depths = combineChainConstants(function, newOperands, depths)
+            if result is None:
+                result = balanceChain(function, newOperands, depths, level)
+        else:
+            result = (function, tuple(newOperands)), max(depths) + 1
+        results[id(node)] = result
+
+    return results[id(tree)][0]
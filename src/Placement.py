@@ -0,0 +1,60 @@
+import math
+
+# Places exported bricks in a layered grid. Every brick goes in the column after the deepest of its sources,
+# so signals flow along x, and bricks in a column are ordered by the average row of their sources to keep
+# wires short. Columns taller than maxRows continue in the next column, and when maxColumns columns are
+# used the layout continues on a new plane above. Separate bricks get their text label right above them.
+
+class BrickPlacement:
+    def __init__(self, spacing: float = 10, maxRows: int = 32, maxColumns: int = None, planeHeight: float = 20, labelHeight: float = 6):
+        if maxRows < 1 or (maxColumns is not None and maxColumns < 1):
+            raise ValueError("Footprint bounds must be at least one brick")
+        self.spacing = spacing
+        self.maxRows = maxRows
+        self.maxColumns = maxColumns
+        self.planeHeight = planeHeight
+        self.labelHeight = labelHeight
+
+    def layers(self, orderedBlocks: list):
+        # orderedBlocks must list every source before the blocks reading it, like topologicalOrder
+        layerOf = {}
+        layers = []
+        for logicBlock in orderedBlocks:
+            layer = 0
+            for sourceName in logicBlock.sourceNames():
+                if sourceName in layerOf:
+                    layer = max(layer, layerOf[sourceName] + 1)
+            layerOf[logicBlock.name] = layer
+            if layer == len(layers):
+                layers.append([])
+            layers[layer].append(logicBlock)
+        return layers
+
+    def place(self, orderedBlocks: list):
+        # Returns {block name: (x, y, z)}
+        positions = {}
+        rowOf = {}
+        column = 0
+
+        for layer in self.layers(orderedBlocks):
+            def barycenter(indexedBlock):
+                index, logicBlock = indexedBlock
+                sourceRows = [rowOf[sourceName] for sourceName in logicBlock.sourceNames() if sourceName in rowOf]
+                return (sum(sourceRows) / len(sourceRows) if sourceRows else index, index)
+
+            orderedLayer = [logicBlock for index, logicBlock in sorted(enumerate(layer), key=barycenter)]
+            for index, logicBlock in enumerate(orderedLayer):
+                blockColumn = column + index // self.maxRows
+                row = index % self.maxRows
+                plane = 0
+                if self.maxColumns is not None:
+                    plane, blockColumn = divmod(blockColumn, self.maxColumns)
+                rowOf[logicBlock.name] = row
+                positions[logicBlock.name] = (blockColumn * self.spacing, row * self.spacing, plane * self.planeHeight)
+            column += math.ceil(len(orderedLayer) / self.maxRows)
+
+        return positions
+
+    def labelPosition(self, position):
+        x, y, z = position
+        return (x, y, z + self.labelHeight)
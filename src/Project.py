@@ -0,0 +1,127 @@
+import gzip
+import json
+
+import Logic
+
+# Project files store a LogicData graph and the scene layout as JSON lines, one compact record per line,
+# so they are written and read as a stream. Files ending in .lbkz are the same records gzip compressed.
+#
+#   {"format": "LogiBrick", "version": 1, ...}                          header
+#   {"b": [name, function, inputA, inputB, separate, label]}           logic block
+#   {"e": [name, equation, optimizationLevel, blockNames, variableNames, outputBlockName, nameIterator, bricksSaved]}
+#   {"c": [name, function, x, y]}                                        component in the scene
+#
+# Wires are not stored, they are rebuilt from the block inputs.
+
+formatName = "LogiBrick"
+formatVersion = 1
+
+def openProjectFile(path: str, mode: str):
+    if mode == "r":
+        with open(path, "rb") as file:
+            compressed = file.read(2) == b"\x1f\x8b"
+    else:
+        compressed = path.endswith(".lbkz")
+    if compressed:
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+def encodeRecord(key: str, values):
+    return json.dumps({key: values}, separators=(",", ":")) + "\n"
+
+def saveProject(path: str, logicData: Logic.LogicData, components=()):
+    # components is an iterable of (name, function, x, y)
+    with openProjectFile(path, "w") as file:
+        file.write(json.dumps({
+            "format": formatName,
+            "version": formatVersion,
+            "optimizationLevel": logicData.optimizationLevel,
+            "numOfEachFunction": logicData.numOfEachFunction
+        }, separators=(",", ":")) + "\n")
+
+        logicBlock: Logic.LogicBlock
+        for logicBlock in logicData.logicData.values():
+            file.write(encodeRecord("b", [logicBlock.name, logicBlock.function, logicBlock.inputA, logicBlock.inputB, logicBlock.separate, logicBlock.label]))
+
+        equationBlock: Logic.EquationBlock
+        for equationBlock in logicData.equationBlocks.values():
+            file.write(encodeRecord("e", [
+                equationBlock.name,
+                equationBlock.equation,
+                equationBlock.optimizationLevel,
+                [logicBlock.name for logicBlock in equationBlock.logicBlocks],
+                equationBlock.variableNames,
+                equationBlock.outputBlockName,
+                equationBlock.nameIterator,
+                equationBlock.bricksSaved
+            ]))
+
+        for name, function, x, y in components:
+            file.write(encodeRecord("c", [name, function, x, y]))
+
+class Project:
+    # A loaded project. The logic graph is decoded up front, component records are only decoded when iterated.
+    def __init__(self, logicData: Logic.LogicData, componentLines: list):
+        self.logicData = logicData
+        self.componentLines = componentLines
+
+    def __len__(self):
+        return len(self.componentLines)
+
+    def components(self):
+        for line in self.componentLines:
+            yield tuple(json.loads(line)["c"])
+
+def decodeBlock(values):
+    name, function, inputA, inputB, separate, label = values
+    logicBlock = Logic.LogicBlock(name, function, None, None, separate)
+    # Inputs go through updateInputs one source at a time so names are interned
+    for sourceName in (inputA if isinstance(inputA, list) else [inputA]):
+        logicBlock.updateInputs(inputA=sourceName)
+    for sourceName in (inputB if isinstance(inputB, list) else [inputB]):
+        logicBlock.updateInputs(inputB=sourceName)
+    logicBlock.label = label
+    return logicBlock
+
+def loadProject(path: str, logicData: Logic.LogicData = None):
+    # Loads the project's graph into logicData (or a new LogicData) and returns a Project.
+    # logicData is only replaced once the whole file has been read.
+    loadedData = Logic.LogicData()
+    componentLines = []
+
+    with openProjectFile(path, "r") as file:
+        header = json.loads(file.readline() or "{}")
+        if header.get("format") != formatName:
+            raise ValueError(f"{path} is not a LogiBrick project")
+        if header.get("version", 0) > formatVersion:
+            raise ValueError(f"{path} was saved by a newer version of LogiBrick (format version {header['version']})")
+        loadedData.optimizationLevel = header.get("optimizationLevel", loadedData.optimizationLevel)
+        loadedData.numOfEachFunction = dict(header.get("numOfEachFunction", {}))
+
+        for line in file:
+            # Component records are the bulk of a large project's layout, keep them undecoded for now
+            if line.startswith('{"c"'):
+                componentLines.append(line)
+                continue
+            record = json.loads(line)
+            if "b" in record:
+                logicBlock = decodeBlock(record["b"])
+                loadedData.logicData[logicBlock.name] = logicBlock
+            elif "e" in record:
+                name, equation, optimizationLevel, blockNames, variableNames, outputBlockName, nameIterator, bricksSaved = record["e"]
+                equationBlock = Logic.EquationBlock(name, equation, optimizationLevel)
+                equationBlock.logicBlocks = [loadedData.logicData[blockName] for blockName in blockNames]
+                equationBlock.variableNames = variableNames
+                equationBlock.outputBlockName = outputBlockName
+                equationBlock.nameIterator = nameIterator
+                equationBlock.bricksSaved = bricksSaved
+                loadedData.equationBlocks[name] = equationBlock
+
+    if logicData is None:
+        return Project(loadedData, componentLines)
+
+    logicData.numOfEachFunction = loadedData.numOfEachFunction
+    logicData.logicData = loadedData.logicData
+    logicData.equationBlocks = loadedData.equationBlocks
+    logicData.optimizationLevel = loadedData.optimizationLevel
+    return Project(logicData, componentLines)
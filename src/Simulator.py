@@ -0,0 +1,118 @@
+import numpy as np
+
+import constants
+import Logic
+
+# Evaluates a logic graph the way the game's math bricks do, over whole arrays of input samples at once.
+# Every brick reads the settled value of its sources, so the result is the output after the circuit
+# has had enough ticks to propagate (feedback loops are rejected by Logic.topologicalOrder).
+
+def safeFmod(a, b):
+    # FMath::Fmod returns 0 instead of NaN when dividing by (almost) zero
+    zeroDivisor = constants.isFmodZeroDivisor(b)
+    return np.where(zeroDivisor, 0.0, np.fmod(a, np.where(zeroDivisor, 1.0, b)))
+
+def roundHalfAwayFromZero(a):
+    return np.sign(a) * np.floor(np.abs(a) + 0.5)
+
+simulationFunctions = {
+    "ADD": lambda a, b: a + b,
+    "SUB": lambda a, b: a - b,
+    "MULT": lambda a, b: a * b,
+    "DIV": lambda a, b: a / b,
+    "MOD": safeFmod,
+    "POWER": lambda a, b: np.power(a, b),
+    "GREATER": lambda a, b: np.greater(a, b).astype(a.dtype),
+    "LESS": lambda a, b: np.less(a, b).astype(a.dtype),
+    "MIN": lambda a, b: np.minimum(a, b),
+    "MAX": lambda a, b: np.maximum(a, b),
+    "ABS": lambda a, b: np.abs(a),
+    "SIGN": lambda a, b: np.sign(a),
+    "ROUND": lambda a, b: roundHalfAwayFromZero(a),
+    "CEIL": lambda a, b: np.ceil(a),
+    "FLOOR": lambda a, b: np.floor(a),
+    "SQRT": lambda a, b: np.sqrt(a),
+    "dSIN": lambda a, b: np.sin(np.radians(a)),
+    "dCOS": lambda a, b: np.cos(np.radians(a)),
+    "dTAN": lambda a, b: np.tan(np.radians(a)),
+    "dASIN": lambda a, b: np.degrees(np.arcsin(a)),
+    "dACOS": lambda a, b: np.degrees(np.arccos(a)),
+    "dATAN": lambda a, b: np.degrees(np.arctan(a)),
+    "rSIN": lambda a, b: np.sin(a),
+    "rCOS": lambda a, b: np.cos(a),
+    "rTAN": lambda a, b: np.tan(a),
+    "rASIN": lambda a, b: np.arcsin(a),
+    "rACOS": lambda a, b: np.arccos(a),
+    "rATAN": lambda a, b: np.arctan(a),
+    "SIN": lambda a, b: np.sin(a),
+    "COS": lambda a, b: np.cos(a),
+    "TAN": lambda a, b: np.tan(a),
+    "ASIN": lambda a, b: np.arcsin(a),
+    "ACOS": lambda a, b: np.arccos(a),
+    "ATAN": lambda a, b: np.arctan(a)
+}
+
+class LogicSimulator:
+    def __init__(self, logicData: dict, dtype=np.float32):
+        self.logicData = logicData
+        self.dtype = dtype
+        self.blockNames = []
+        self.blockIndex = {}
+        self.program = []
+
+    def compileOperand(self, operand):
+        # Constant channels become a scalar that numpy broadcasts, wired channels a tuple of source slots that are summed
+        if isinstance(operand, list):
+            return tuple(self.blockIndex[name] for name in operand if name in self.blockIndex)
+        return np.dtype(self.dtype).type(operand if operand is not None else 0.0)
+
+    def compile(self):
+        order = Logic.topologicalOrder(self.logicData)
+        self.blockNames = [logicBlock.name for logicBlock in order]
+        self.blockIndex = {name: index for index, name in enumerate(self.blockNames)}
+        self.program = []
+        logicBlock: Logic.LogicBlock
+        for index, logicBlock in enumerate(order):
+            self.program.append((
+                index,
+                simulationFunctions[logicBlock.function],
+                self.compileOperand(logicBlock.inputA),
+                self.compileOperand(logicBlock.inputB)
+            ))
+        return self.program
+
+    def evaluateOperand(self, operand, values, shape):
+        if isinstance(operand, tuple):
+            if len(operand) == 1:
+                return values[operand[0]]
+            elif len(operand) == 0:
+                return np.zeros(shape, dtype=self.dtype)
+            return values[list(operand)].sum(axis=0)
+        return operand
+
+    def simulate(self, inputs: dict, outputNames=None):
+        # inputs maps block names (such as an equation's variable blocks) to scalars or arrays of samples,
+        # those blocks output the given values instead of computing their function.
+        # The program is compiled on first use, call compile() again after editing the design.
+        if not self.program:
+            self.compile()
+
+        for name in inputs:
+            if name not in self.blockIndex:
+                raise KeyError(f"{name} is not a block in this design")
+
+        inputArrays = np.broadcast_arrays(*[np.asarray(value, dtype=self.dtype) for value in inputs.values()]) if inputs else []
+        shape = inputArrays[0].shape if inputs else (1,)
+        overrides = {self.blockIndex[name]: array for name, array in zip(inputs.keys(), inputArrays)}
+
+        values = np.empty((len(self.program),) + shape, dtype=self.dtype)
+        with np.errstate(all="ignore"):
+            for index, function, operandA, operandB in self.program:
+                if index in overrides:
+                    values[index] = overrides[index]
+                else:
+                    values[index] = function(self.evaluateOperand(operandA, values, shape), self.evaluateOperand(operandB, values, shape))
+
+        if outputNames is None:
+            outputNames = self.blockNames
+        return {name: values[self.blockIndex[name]] for name in outputNames}
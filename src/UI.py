@@ -2,9 +2,17 @@ from PyQt5.QtWidgets import *
 from PyQt5.QtCore import *
 from PyQt5.QtGui import *
 import constants
+import Analysis
+import ExportCache
 import Logic
+import Project
+import itertools
+import logging
+import math
 import sys
 
+logger = logging.getLogger(__name__)
+
 class ComponentPin(QGraphicsItem):
     def __init__(self, x, y, isInput, parent=None, pinIndex=None):
         super().__init__(parent)
@@ -114,22 +122,33 @@ class Wire(QGraphicsItem):
         if endPin:
             endPin.addWire(self)
         
+        # Geometry is cached and only rebuilt when an endpoint moves
         self.path = QPainterPath()
+        self.pathEnds = None
+        self.cachedBoundingRect = QRectF()
+        self.cachedShape = None
         if startPos and startPin:
             start = startPin.scenePos()
             self.updatePath(start, startPos)
         else:
             self.updatePosition()
 
+    hitWidth = 10
+
     def boundingRect(self):
-        # Add some padding for the pen width
-        return self.path.boundingRect().adjusted(-5, -5, 5, 5)
+        return self.cachedBoundingRect
     
     def shape(self):
-        # Create a wider shape for easier mouse interaction
-        stroker = QPainterPathStroker()
-        stroker.setWidth(10)
-        return stroker.createStroke(self.path)
+        # A wider stroke for easier mouse interaction, built on first use after the path changes
+        if self.cachedShape is None:
+            stroker = QPainterPathStroker()
+            stroker.setWidth(self.hitWidth)
+            self.cachedShape = stroker.createStroke(self.path)
+        return self.cachedShape
+
+    def contains(self, point):
+        # Most points are rejected by the bounding rect before the stroke is tested
+        return self.cachedBoundingRect.contains(point) and self.shape().contains(point)
     
     def setHighlight(self, highlight):
         match highlight:
@@ -158,6 +177,11 @@ class Wire(QGraphicsItem):
             newStart = start
             newEnd = end
 
+        pathEnds = (newStart.x(), newStart.y(), newEnd.x(), newEnd.y())
+        if pathEnds == self.pathEnds:
+            return
+        self.pathEnds = pathEnds
+
         self.path = QPainterPath()
         self.path.moveTo(newStart)
         
@@ -173,8 +197,11 @@ class Wire(QGraphicsItem):
         
         # Draw cubic bezier curve
         self.path.cubicTo(ctrl1, ctrl2, newEnd)
-        
+
         self.prepareGeometryChange()
+        # Add some padding for the pen width
+        self.cachedBoundingRect = self.path.boundingRect().adjusted(-5, -5, 5, 5)
+        self.cachedShape = None
 
     def updatePosition(self):
         """Update wire position based on pin positions"""
@@ -197,24 +224,83 @@ class Wire(QGraphicsItem):
         if self.startPin and (self in self.startPin.wires):
             if self.endPin and self.startPin.isInput:
                 if (self.endPin.parent.function == "EQN"):
-                    self.startPin.parent.updateLogicBlock(self.startPin.pinIndex, self.endPin.parent.equationBlock.variableNames[self.startPin.pinIndex], True)
+                    self.startPin.parent.updateLogicBlock(self.startPin.pinIndex, self.endPin.parent.outputBlockName, True)
                 else:
                     self.startPin.parent.updateLogicBlock(self.startPin.pinIndex, self.endPin.parent.uniqueName, True)
             self.startPin.removeWire(self)
         if self.endPin and (self in self.endPin.wires):
             if self.startPin and self.endPin.isInput:
                 if (self.startPin.parent.function == "EQN"):
-                    self.endPin.parent.updateLogicBlock(self.endPin.pinIndex, self.startPin.parent.equationBlock.variableNames[self.endPin.pinIndex], True)
+                    self.endPin.parent.updateLogicBlock(self.endPin.pinIndex, self.startPin.parent.outputBlockName, True)
                 else:
                     self.endPin.parent.updateLogicBlock(self.endPin.pinIndex, self.startPin.parent.uniqueName, True)
             self.endPin.removeWire(self)
 
-class customProxyExtension(QGraphicsProxyWidget):
-    def __init__(self, index, parent=None):
+class InputField(QGraphicsItem):
+    # A component input painted by the item itself, editing goes through the scene's shared InlineEditor
+    def __init__(self, index, parent, width, prefix=""):
         super().__init__(parent)
         self.index = index
         self.parent = parent
+        self.width = width
+        self.height = 20
+        self.prefix = prefix
+        self.value = ""
+        self.readOnly = False
         self.setAcceptHoverEvents(True)
+        self.setAcceptedMouseButtons(Qt.LeftButton)
+
+        self.font = QFont()
+        self.font.setBold(True)
+        self.metrics = QFontMetricsF(self.font)
+        self.pen = QPen(Qt.black, 1)
+        self.normalBrush = QBrush(Qt.white)
+        self.readOnlyBrush = QBrush(QColor("#cccccc"))
+
+        # Variable names of equations are shown in front of the box
+        prefixWidth = (self.metrics.horizontalAdvance(prefix) + 4) if prefix else 0
+        self.boxRect = QRectF(prefixWidth, 0, width - prefixWidth, self.height)
+        self.displayText = ""
+
+    def text(self):
+        return self.value
+
+    def setText(self, text):
+        self.value = text
+        self.displayText = self.metrics.elidedText(text, Qt.ElideRight, self.boxRect.width() - 6)
+        self.update()
+
+    def isReadOnly(self):
+        return self.readOnly
+
+    def setReadOnly(self, readOnly):
+        self.readOnly = readOnly
+        scene = self.scene()
+        if readOnly and isinstance(scene, CircuitDesignerScene) and scene.inlineEditor and scene.inlineEditor.field is self:
+            scene.inlineEditor.cancelEditing()
+        self.update()
+
+    def boundingRect(self):
+        return QRectF(0, 0, self.width, self.height)
+
+    def paint(self, painter, option, widget):
+        painter.setFont(self.font)
+        if self.prefix:
+            painter.setPen(Qt.black)
+            painter.drawText(QRectF(0, 0, self.boxRect.left() - 2, self.height), Qt.AlignRight | Qt.AlignVCenter, self.prefix)
+        painter.setPen(self.pen)
+        painter.setBrush(self.readOnlyBrush if self.readOnly else self.normalBrush)
+        painter.drawRect(self.boxRect)
+        painter.drawText(self.boxRect, Qt.AlignCenter, self.displayText)
+
+    def mousePressEvent(self, event):
+        scene = self.scene()
+        if not self.readOnly and isinstance(scene, CircuitDesignerScene):
+            scene.editField(self)
+        event.accept()
+
+    def editingFinished(self):
+        self.parent.updateLogicBlock(self.index)
 
     def setConnectedComponentHighlight(self, highlight):
         parentComponent: Component = self.parent
@@ -226,7 +312,7 @@ class customProxyExtension(QGraphicsProxyWidget):
         parentComponent: Component = self.parent
         if (hasattr(parentComponent, 'setHighlight')):
             parentComponent.setHighlight(0)
-        if (parentComponent.inputBoxes[self.index].isReadOnly):
+        if (self.readOnly):
             self.setConnectedComponentHighlight(1)
         super().hoverEnterEvent(event)
         
@@ -234,10 +320,111 @@ class customProxyExtension(QGraphicsProxyWidget):
         parentComponent: Component = self.parent
         if (hasattr(parentComponent, 'setHighlight')):
             parentComponent.setHighlight(1)
-        if (parentComponent.inputBoxes[self.index].isReadOnly):
+        if (self.readOnly):
             self.setConnectedComponentHighlight(0)
         super().hoverLeaveEvent(event)
 
+class ToggleField(QGraphicsItem):
+    # A painted checkbox, stateChanged(state) gets Qt.Checked or Qt.Unchecked like QCheckBox.stateChanged
+    def __init__(self, text, font, stateChanged, parent=None):
+        super().__init__(parent)
+        self.text = text
+        self.font = font
+        self.stateChanged = stateChanged
+        self.checked = False
+        self.boxSize = 12
+        self.height = 20
+        self.width = self.boxSize + 6 + QFontMetricsF(font).horizontalAdvance(text)
+        self.pen = QPen(Qt.white, 1.5)
+        self.setAcceptedMouseButtons(Qt.LeftButton)
+
+    def isChecked(self):
+        return self.checked
+
+    def setChecked(self, checked):
+        if checked != self.checked:
+            self.checked = checked
+            self.update()
+            self.stateChanged(Qt.Checked if checked else Qt.Unchecked)
+
+    def boundingRect(self):
+        return QRectF(0, 0, self.width, self.height)
+
+    def paint(self, painter, option, widget):
+        box = QRectF(1, (self.height - self.boxSize) / 2, self.boxSize, self.boxSize)
+        painter.setPen(self.pen)
+        painter.setBrush(Qt.NoBrush)
+        painter.drawRect(box)
+        if self.checked:
+            painter.drawLine(QPointF(box.left() + 3, box.center().y()), QPointF(box.center().x() - 1, box.bottom() - 3))
+            painter.drawLine(QPointF(box.center().x() - 1, box.bottom() - 3), QPointF(box.right() - 2, box.top() + 3))
+        painter.setFont(self.font)
+        painter.drawText(QRectF(self.boxSize + 6, 0, self.width, self.height), Qt.AlignLeft | Qt.AlignVCenter, self.text)
+
+    def mousePressEvent(self, event):
+        event.accept()
+
+    def mouseReleaseEvent(self, event):
+        if self.boundingRect().contains(event.pos()):
+            self.setChecked(not self.checked)
+        event.accept()
+
+class InlineEditor(QLineEdit):
+    # The one line edit shared by every InputField, placed over the field being edited
+    def __init__(self):
+        super().__init__()
+        self.setValidator(QDoubleValidator())
+        self.setAlignment(Qt.AlignCenter)
+        self.setStyleSheet("background-color: white; border: 1px solid black;")
+        font = QFont()
+        font.setBold(True)
+        self.setFont(font)
+        self.field = None
+
+        self.proxy = QGraphicsProxyWidget()
+        self.proxy.setWidget(self)
+        self.proxy.setZValue(1000)
+        self.proxy.hide()
+        self.returnPressed.connect(self.finishEditing)
+
+    def startEditing(self, field: InputField):
+        if self.field:
+            self.finishEditing()
+        self.field = field
+        self.proxy.setPos(field.mapToScene(field.boxRect.topLeft()))
+        self.proxy.resize(field.boxRect.size())
+        self.setText(field.text())
+        self.proxy.show()
+        self.proxy.setFocus()
+        self.setFocus()
+        self.selectAll()
+
+    def finishEditing(self):
+        field = self.field
+        if field is None:
+            return
+        self.field = None
+        self.proxy.hide()
+        # Text the validator doesn't accept (empty or a lone "-") keeps the old value, like QLineEdit
+        # never emitting editingFinished for it
+        if self.hasAcceptableInput():
+            field.setText(self.text())
+            field.editingFinished()
+
+    def cancelEditing(self):
+        self.field = None
+        self.proxy.hide()
+
+    def keyPressEvent(self, event):
+        if event.key() == Qt.Key_Escape:
+            self.cancelEditing()
+        else:
+            super().keyPressEvent(event)
+
+    def focusOutEvent(self, event):
+        super().focusOutEvent(event)
+        self.finishEditing()
+
 class EditableLabel(QGraphicsTextItem):
     def __init__(self, text, parent=None):
         super().__init__(text, parent)
@@ -326,6 +513,7 @@ class Component(QGraphicsRectItem):
         # Component Label
         # label = QGraphicsTextItem(self.uniqueName, self)
         label = EditableLabel(self.uniqueName, self)
+        self.nameLabel = label
         label.setDefaultTextColor(Qt.white)
         label.setFlag(label.ItemStacksBehindParent, False)
         font = QFont()
@@ -363,49 +551,12 @@ class Component(QGraphicsRectItem):
 
         # Input Boxes
         self.inputBoxes = []
-        self.inputBoxProxies = []
-
-        inputBoxWidth = (self.width - 45) if (self.function == "EQN") else (self.width - 25)
 
         for i in range(numInputs):
-            # if (self.equationBlock):
-            #     self.variableToIndex[i] = self.equationBlock.variableNames[i]
-
-            inputBox = QLineEdit()
-            inputBox.setValidator(QDoubleValidator())
-            inputBox.setMaximumWidth(inputBoxWidth)
-            inputBox.setAlignment(Qt.AlignCenter)
-            inputBox.setStyleSheet("background-color: white; border: 1px solid black;")
-            inputBoxFont = QFont()
-            inputBoxFont.setBold(True)
-            inputBox.setFont(inputBoxFont)
-
-            # Update Logic Data is input set
-            inputBox.editingFinished.connect(lambda checked=None, text=inputBox.text(), i=i: self.updateLogicBlock(i))
-
-            proxy = customProxyExtension(i, self)
-
-            if (self.function == "EQN"):
-                widget = QWidget()
-                layout = QHBoxLayout(widget)
-
-                label = QLabel(f"{self.equationBlock.variableNames[i][len(self.uniqueName):]}=")
-                label.setStyleSheet("background-color: transparent; font-weight: bold")
-                label.setAlignment(Qt.AlignRight)
-                layout.addWidget(label)
-                layout.addWidget(inputBox)
-                layout.setContentsMargins(0, 0, 0, 0)
-
-                widget.setMaximumWidth(self.width - 25)
-                widget.setStyleSheet("background-color: transparent;")
-                proxy.setWidget(widget)
-            else:
-                proxy.setWidget(inputBox)
-
-            proxy.setPos(10, 28 + heightOffset + (i * 30))
-
+            prefix = f"{self.equationBlock.variableNames[i][len(self.uniqueName):]}=" if (self.function == "EQN") else ""
+            inputBox = InputField(i, self, self.width - 25, prefix)
+            inputBox.setPos(10, 28 + heightOffset + (i * 30))
             self.inputBoxes.append(inputBox)
-            self.inputBoxProxies.append(proxy)
 
         # Pins
         self.outpuPin = ComponentPin(self.width, self.height/2, False, self)
@@ -418,40 +569,54 @@ class Component(QGraphicsRectItem):
             self.inputPins.append(pin)
         
         # Checkboxes
+        self.checkboxes = []
 
         if (self.function == "EQN"):
-            checkbox1 = QCheckBox("Sep. Out")
-            checkbox1.setFont(font)
-            checkbox1.stateChanged.connect(self.setEQNOutSeparate)
-            checkbox1.setStyleSheet("background-color: transparent; color: white;")
-
-            proxy = QGraphicsProxyWidget(self)
-            proxy.setWidget(checkbox1)
-            proxy.setPos(10, 25 + heightOffset + (numInputs * 30))
-
-            checkbox2 = QCheckBox("Sep. Var")
-            checkbox2.stateChanged.connect(self.setEQNVarSeparate)
-            checkbox2.setFont(font)
-            checkbox2.setStyleSheet("background-color: transparent; color: white;")
-
-            proxy = QGraphicsProxyWidget(self)
-            proxy.setWidget(checkbox2)
-            proxy.setPos(10, 45 + heightOffset + (numInputs * 30))
-        else:
-            checkbox = QCheckBox("Separate")
-            checkbox.stateChanged.connect(self.setSeparate)
-            checkbox.setFont(font)
-            checkbox.setStyleSheet("background-color: transparent; color: white;")
+            checkbox1 = ToggleField("Sep. Out", font, self.setEQNOutSeparate, self)
+            checkbox1.setPos(10, 25 + heightOffset + (numInputs * 30))
+            self.checkboxes.append(checkbox1)
 
-            proxy = QGraphicsProxyWidget(self)
-            proxy.setWidget(checkbox)
-            proxy.setPos(10, 25 + heightOffset + (numInputs * 30))
+            checkbox2 = ToggleField("Sep. Var", font, self.setEQNVarSeparate, self)
+            checkbox2.setPos(10, 45 + heightOffset + (numInputs * 30))
+            self.checkboxes.append(checkbox2)
+        else:
+            checkbox = ToggleField("Separate", font, self.setSeparate, self)
+            checkbox.setPos(10, 25 + heightOffset + (numInputs * 30))
+            self.checkboxes.append(checkbox)
 
     def setHighlight(self, highlight):
         match highlight:
             case 0: self.setBrush(self.normalBrush)
             case 1: self.setBrush(self.hoverBrush)
 
+    def setDetailsVisible(self, visible: bool):
+        # Labels, input boxes, checkboxes and pins are all child items, zoomed out only the box is drawn
+        for child in self.childItems():
+            child.setVisible(visible)
+
+    def inputLogicBlock(self, index):
+        # Logic block (and which of its inputs) that the input pin at index feeds
+        if (self.function == "EQN"):
+            return self.logicData.logicData[self.equationBlock.variableNames[index]], 0
+        return self.logicData.logicData[self.uniqueName], index
+
+    def syncFromLogicData(self):
+        # Shows the separate flags, label and constant inputs of the logic blocks, used after loading a project
+        if (self.function == "EQN"):
+            self.checkboxes[0].setChecked(self.logicData.logicData[self.outputBlockName].separate)
+            if len(self.equationBlock.variableNames) > 0:
+                self.checkboxes[1].setChecked(self.logicData.logicData[self.equationBlock.variableNames[0]].separate)
+        else:
+            logicBlock: Logic.LogicBlock = self.logicData.logicData[self.uniqueName]
+            self.checkboxes[0].setChecked(logicBlock.separate)
+            if logicBlock.label != "":
+                self.nameLabel.setPlainText(logicBlock.label)
+        for index in range(len(self.inputBoxes)):
+            logicBlock, inputIndex = self.inputLogicBlock(index)
+            value = logicBlock.inputA if inputIndex == 0 else logicBlock.inputB
+            if isinstance(value, (int, float)) and value != 0:
+                self.inputBoxes[index].setText(f"{value:g}")
+
     def hoverEnterEvent(self, event):
         self.setHighlight(1)
         super().hoverEnterEvent(event)
@@ -465,23 +630,24 @@ class Component(QGraphicsRectItem):
 
     def itemChange(self, change, value):
         if change == QGraphicsItem.ItemPositionHasChanged:
-            for pin in self.inputPins:
-                for wire in pin.wires:
+            scene = self.scene()
+            wires = itertools.chain(self.outpuPin.wires, *(pin.wires for pin in self.inputPins))
+            if isinstance(scene, CircuitDesignerScene):
+                # Wires shared by several moving components are only rebuilt once, after the move
+                scene.markComponentMoved(self, wires)
+            else:
+                for wire in wires:
                     wire.updatePosition()
-            for wire in self.outpuPin.wires:
-                wire.updatePosition()
         return super().itemChange(change, value)
     
     def disableInputBox(self, inputBoxIndex, text=""):
-        inputBox:QLineEdit = self.inputBoxes[inputBoxIndex]
+        inputBox: InputField = self.inputBoxes[inputBoxIndex]
         inputBox.setReadOnly(True)
-        inputBox.setStyleSheet("background-color: #cccccc; border: 1px solid black;")
         inputBox.setText(text)
 
     def enableInputBox(self, inputBoxIndex):
-        inputBox:QLineEdit = self.inputBoxes[inputBoxIndex]
+        inputBox: InputField = self.inputBoxes[inputBoxIndex]
         inputBox.setReadOnly(False)
-        inputBox.setStyleSheet("background-color: white; border: 1px solid black;")
         inputBox.setText("")  # Clear the text when disconnected
 
     def setSeparate(self, state):
@@ -538,11 +704,29 @@ class CircuitDesignerView(QGraphicsView):
             self.scale(self.zoomFactor, self.zoomFactor)
         else:
             self.scale(1/self.zoomFactor, 1/self.zoomFactor)
+        self.scene().setZoom(self.transform().m11())
+        self.scene().expandSceneRect(self.mapToScene(self.viewport().rect()).boundingRect())
 
 class CircuitDesignerScene(QGraphicsScene):
+    # Below this zoom components are drawn as plain boxes
+    detailZoomThreshold = 0.4
+
+    # The canvas starts at this size and grows to keep sceneMargin of room around everything on it
+    initialSceneRect = QRectF(0, 0, 5000, 5000)
+    sceneMargin = 2000
+
+    # Qt's automatic BSP depth gives about one leaf per item, one level deeper measured faster for hit tests
+    leavesPerItem = 2
+    maxIndexDepth = 16
+
     def __init__(self, logicData: Logic.LogicData):
         super().__init__()
+        self.setSceneRect(self.initialSceneRect)
         self.mainView = None
+        self.showDetails = True
+
+        # Shared editor for input fields, created the first time one is edited
+        self.inlineEditor = None
 
         # Panning variables
         self.panning = False
@@ -558,20 +742,197 @@ class CircuitDesignerScene(QGraphicsScene):
         # Logic Data
         self.logicData = logicData
 
+        # Project loading
+        self.pendingComponents = None
+        self.loadedComponents = {}
+        self.loadGeneration = 0
+
+        # Wires whose endpoints moved (a dict keeps them in order without duplicates) and where the held
+        # component should go, both applied once per event loop iteration
+        self.dirtyWires = {}
+        self.movedComponents = {}
+        self.heldComponentTarget = None
+        self.updateScheduled = False
+
+        # Spatial index
+        self.componentCount = 0
+        self.bulkUpdates = 0
+        self.tuneIndex()
+
     def setMainView(self):
         self.mainView = self.views()[0]
 
+    def setZoom(self, zoom: float):
+        showDetails = (zoom >= self.detailZoomThreshold)
+        if showDetails != self.showDetails:
+            self.showDetails = showDetails
+            if not showDetails and self.inlineEditor:
+                self.inlineEditor.finishEditing()
+            for item in self.items():
+                if isinstance(item, Component):
+                    item.setDetailsVisible(showDetails)
+
+    def editField(self, field: InputField):
+        if self.inlineEditor is None:
+            self.inlineEditor = InlineEditor()
+            self.addItem(self.inlineEditor.proxy)
+        self.inlineEditor.startEditing(field)
+
+    def expandSceneRect(self, rect: QRectF):
+        # Never shrinks while editing, so the view doesn't jump when something is moved back
+        sceneRect = self.sceneRect()
+        if not sceneRect.contains(rect):
+            self.setSceneRect(sceneRect.united(rect.adjusted(-self.sceneMargin, -self.sceneMargin, self.sceneMargin, self.sceneMargin)))
+
+    def tuneIndex(self):
+        if self.itemIndexMethod() != QGraphicsScene.BspTreeIndex:
+            return
+        itemCount = len(self.items())
+        depth = min(self.maxIndexDepth, max(1, math.ceil(math.log2(max(1, itemCount * self.leavesPerItem)))))
+        if depth != self.bspTreeDepth():
+            logger.debug("BSP tree depth %d for %d items", depth, itemCount)
+            self.setBspTreeDepth(depth)
+
+    def beginBulkUpdate(self):
+        # Adding many items one by one keeps restructuring the index, so bulk operations run without one
+        if self.bulkUpdates == 0:
+            self.setItemIndexMethod(QGraphicsScene.NoIndex)
+        self.bulkUpdates += 1
+
+    def endBulkUpdate(self):
+        self.bulkUpdates -= 1
+        if self.bulkUpdates == 0:
+            # Rebuilt once, with a depth for the final item count
+            self.setItemIndexMethod(QGraphicsScene.BspTreeIndex)
+            self.tuneIndex()
+            self.expandSceneRect(self.itemsBoundingRect())
+
+    def addComponentItem(self, component: Component):
+        if not self.showDetails:
+            component.setDetailsVisible(False)
+        self.addItem(component)
+        self.componentCount += 1
+        if self.bulkUpdates == 0:
+            self.expandSceneRect(component.sceneBoundingRect())
+            # Counting the items is linear, so the depth is only checked each time the design doubles
+            if self.componentCount & (self.componentCount - 1) == 0:
+                self.tuneIndex()
+
     def addComponent(self, functionName):
         logicBlock: Logic.LogicBlock = self.logicData.addLogicBlock(functionName)
         component = Component(0, 0, logicBlock.name, functionName, self.logicData)
         self.heldComponent = component
-        self.addItem(component)
+        self.addComponentItem(component)
 
     def addComponentEq(self, equation):
         equationBlock: Logic.EquationBlock = self.logicData.addEquationBlock(equation)
         component = Component(0, 0, equationBlock.name, "EQN", self.logicData)
         self.heldComponent = component
-        self.addItem(component)
+        self.addComponentItem(component)
+
+    def placeComponent(self, name, function, x, y):
+        # Adds a component for logic that already exists in the logic data
+        component = Component(x, y, name, function, self.logicData)
+        self.addComponentItem(component)
+        return component
+
+    def componentLayout(self):
+        # (name, function, x, y) of every component, as stored in project files
+        return [(item.uniqueName, item.function, item.x(), item.y()) for item in self.items() if isinstance(item, Component)]
+
+    def clearDesign(self):
+        if self.inlineEditor:
+            self.inlineEditor.cancelEditing()
+        self.clear()
+        # clear() deleted the editor's proxy along with everything else
+        self.inlineEditor = None
+        self.setSceneRect(self.initialSceneRect)
+        self.componentCount = 0
+        self.dirtyWires = {}
+        self.movedComponents = {}
+        self.heldComponentTarget = None
+        self.heldComponent = None
+        self.heldWire = None
+        self.drawingWire = False
+        # Stops a load that is still placing batches, its queued callbacks see a newer generation
+        self.loadGeneration += 1
+        self.pendingComponents = None
+        self.loadedComponents = {}
+        if self.bulkUpdates > 0:
+            self.bulkUpdates = 0
+            self.setItemIndexMethod(QGraphicsScene.BspTreeIndex)
+            self.tuneIndex()
+
+    def loadProject(self, project: Project.Project, batchSize=200):
+        # The logic graph is already loaded, components are created a batch per event loop iteration
+        # so the window stays responsive while large projects are placed
+        self.clearDesign()
+        self.beginBulkUpdate()
+        self.pendingComponents = project.components()
+        self.loadNextComponents(batchSize, self.loadGeneration)
+
+    def loadNextComponents(self, batchSize, generation):
+        if generation != self.loadGeneration:
+            return
+        placed = 0
+        for name, function, x, y in itertools.islice(self.pendingComponents, batchSize):
+            component = self.placeComponent(name, function, x, y)
+            component.syncFromLogicData()
+            self.loadedComponents[component.outputBlockName if function == "EQN" else name] = component
+            placed += 1
+        if placed == batchSize:
+            QTimer.singleShot(0, lambda: self.loadNextComponents(batchSize, generation))
+        else:
+            self.connectLoadedComponents()
+
+    def connectLoadedComponents(self):
+        # Rebuilds the wires from the logic block inputs
+        component: Component
+        for component in self.loadedComponents.values():
+            for index, pin in enumerate(component.inputPins):
+                logicBlock, inputIndex = component.inputLogicBlock(index)
+                sources = logicBlock.inputA if inputIndex == 0 else logicBlock.inputB
+                if isinstance(sources, list):
+                    for sourceName in sources:
+                        if sourceName in self.loadedComponents:
+                            self.addItem(Wire(self.loadedComponents[sourceName].outpuPin, pin))
+        self.pendingComponents = None
+        self.loadedComponents = {}
+        self.endBulkUpdate()
+
+    def scheduleUpdate(self):
+        if not self.updateScheduled:
+            self.updateScheduled = True
+            QTimer.singleShot(0, self.flushUpdates)
+
+    def markWiresDirty(self, wires):
+        for wire in wires:
+            self.dirtyWires[wire] = None
+        self.scheduleUpdate()
+
+    def markComponentMoved(self, component: Component, wires):
+        self.movedComponents[component] = None
+        self.markWiresDirty(wires)
+
+    def flushUpdates(self):
+        if self.heldComponentTarget is not None:
+            if self.heldComponent:
+                self.heldComponent.setPos(self.heldComponentTarget)
+            self.heldComponentTarget = None
+        dirtyWires = self.dirtyWires
+        movedComponents = self.movedComponents
+        self.dirtyWires = {}
+        self.movedComponents = {}
+        self.updateScheduled = False
+        wire: Wire
+        for wire in dirtyWires:
+            # Skip wires removed since they were marked
+            if wire.scene() is self:
+                wire.updatePosition()
+        component: Component
+        for component in movedComponents:
+            if component.scene() is self:
+                self.expandSceneRect(component.sceneBoundingRect())
 
     def startWire(self, startPin: ComponentPin, startPos: QPointF):
         self.drawingWire = True
@@ -596,29 +957,24 @@ class CircuitDesignerScene(QGraphicsScene):
             self.heldWire.endPin = endPin
             endPin.addWire(self.heldWire)
             self.heldWire.updatePosition()
+            logger.debug("Wired %s to %s", startPin.parent.uniqueName, endPin.parent.uniqueName)
             if startPin.parent.function == "EQN":
                 if startPin.isInput:
                     startPin.updateAssociatedInputBox()
                     if endPin.parent.function == "EQN":
-                        print("startPin is EQN, endPin is EQN")
                         startPin.parent.updateLogicBlock(startPin.pinIndex, endPin.parent.outputBlockName)
                     else:
-                        print("startPin is EQN, endPin is not EQN")
                         startPin.parent.updateLogicBlock(startPin.pinIndex, endPin.parent.uniqueName)
                 else:
-                    print ("test1")
                     endPin.parent.updateLogicBlock(endPin.pinIndex, startPin.parent.outputBlockName)
             else:
                 if startPin.isInput:
                     startPin.updateAssociatedInputBox()
                     if endPin.parent.function == "EQN":
-                        print("startPin is not EQN, endPin is EQN")
                         startPin.parent.updateLogicBlock(startPin.pinIndex, endPin.parent.outputBlockName)
                     else:
-                        print("startPin is not EQN, endPin is not EQN")
                         startPin.parent.updateLogicBlock(startPin.pinIndex, endPin.parent.uniqueName)
                 else:
-                    print ("test2")
                     endPin.parent.updateLogicBlock(endPin.pinIndex, startPin.parent.uniqueName)
             self.drawingWire = False
             self.heldWire = None
@@ -632,7 +988,10 @@ class CircuitDesignerScene(QGraphicsScene):
         self.heldWire = None
 
     def removeComponent(self, component: Component):
+        if self.inlineEditor and self.inlineEditor.field in component.inputBoxes:
+            self.inlineEditor.cancelEditing()
         component.removeFromScene()
+        self.componentCount -= 1
         if (component.function == "EQN"):
             self.logicData.removeEquationBlock(component.uniqueName)
         else:
@@ -674,10 +1033,16 @@ class CircuitDesignerScene(QGraphicsScene):
     
     def mouseMoveEvent(self, event):
         if self.heldComponent:
-            self.heldComponent.setPos(event.scenePos().x() - (self.heldComponent.width / 2), event.scenePos().y() - (self.heldComponent.height / 2))
+            # Only the last position before the next update is applied
+            self.heldComponentTarget = QPointF(event.scenePos().x() - (self.heldComponent.width / 2), event.scenePos().y() - (self.heldComponent.height / 2))
+            self.scheduleUpdate()
         elif self.panning and self.lastPanPos:
             delta = event.screenPos() - self.lastPanPos
             self.lastPanPos = event.screenPos()
+            # Grows the canvas ahead of the pan so the scroll bars never hold it back
+            scale = self.mainView.transform().m11()
+            visibleRect = self.mainView.mapToScene(self.mainView.viewport().rect()).boundingRect()
+            self.expandSceneRect(visibleRect.translated(-delta.x() / scale, -delta.y() / scale))
             self.mainView.horizontalScrollBar().setValue(self.mainView.horizontalScrollBar().value() - delta.x())
             self.mainView.verticalScrollBar().setValue(self.mainView.verticalScrollBar().value() - delta.y())
         elif self.drawingWire and self.heldWire:
@@ -698,6 +1063,7 @@ class CircuitDesignerScene(QGraphicsScene):
             itemComponent = None
 
         if self.heldComponent:
+            self.flushUpdates()
             self.heldComponent = None
             event.accept()
         elif event.button() == Qt.MiddleButton and self.panning:
@@ -728,11 +1094,10 @@ class CircuitDesignerWindow(QMainWindow):
         self.logicData = Logic.LogicData()
 
         # Converter
-        self.converter = Logic.LogicExporter(self.logicData.logicData)
+        self.converter = Logic.LogicExporter(self.logicData, cache=ExportCache.ExportCache())
 
         # Main Designer View
         self.scene = CircuitDesignerScene(self.logicData)
-        self.scene.setSceneRect(0, 0, 5000, 5000)
         self.view = CircuitDesignerView(self.scene)
         self.scene.setMainView()
 
@@ -764,7 +1129,26 @@ class CircuitDesignerWindow(QMainWindow):
         equationButton = QPushButton("Equation")
         equationButton.pressed.connect(self.equationPopup)
 
+        self.pruneCheckbox = QCheckBox("Prune unused bricks")
+        self.pruneCheckbox.stateChanged.connect(self.setPrune)
+
+        analyzeButton = QPushButton("Analyze")
+        analyzeButton.pressed.connect(self.analyzePopup)
+
+        saveButton = QPushButton("Save")
+        saveButton.pressed.connect(self.savePopup)
+
+        openButton = QPushButton("Open")
+        openButton.pressed.connect(self.openPopup)
+
+        fileLayout = QHBoxLayout()
+        fileLayout.addWidget(saveButton)
+        fileLayout.addWidget(openButton)
+
+        sidebarLayer1.addLayout(fileLayout)
         sidebarLayer1.addWidget(generateButton)
+        sidebarLayer1.addWidget(self.pruneCheckbox)
+        sidebarLayer1.addWidget(analyzeButton)
         sidebarLayer1.addItem(QSpacerItem(0, 15, QSizePolicy.Fixed, QSizePolicy.Minimum))
         sidebarLayer1.addWidget(equationButton)
         sidebarLayer1.addLayout(sidebarLayer2)
@@ -785,19 +1169,60 @@ class CircuitDesignerWindow(QMainWindow):
         text, ok = QInputDialog.getText(self, 'Creation Name', 'Enter Name: ')
 
         if ok and text:
-            self.converter.convertLogicDataToCreation(text)
+            try:
+                removed = self.converter.convertLogicDataToCreation(text)
+            except Logic.LogicCycleError as error:
+                QMessageBox.warning(self, 'Error!', str(error))
+                return
+            if removed:
+                QMessageBox.information(self, 'Pruned', f"Left out {len(removed)} bricks:\n" + "\n".join(f"{name} ({reason})" for name, reason in removed.items()))
         elif ok:
             QMessageBox.warning(self, 'Error!', 'Please enter name!')
 
+    def setPrune(self, state):
+        self.converter.prune = (state == Qt.Checked)
+
+    def analyzePopup(self):
+        try:
+            analysis = Analysis.LogicAnalysis(self.logicData)
+        except Logic.LogicCycleError as error:
+            QMessageBox.warning(self, 'Error!', str(error))
+            return
+        QMessageBox.information(self, 'Analysis', analysis.summary())
+
+    def savePopup(self):
+        path, _ = QFileDialog.getSaveFileName(self, 'Save Project', '', 'LogiBrick project (*.lbk);;Compressed LogiBrick project (*.lbkz)')
+
+        if path:
+            try:
+                Project.saveProject(path, self.logicData, self.scene.componentLayout())
+            except OSError as error:
+                QMessageBox.warning(self, 'Error!', str(error))
+
+    def openPopup(self):
+        path, _ = QFileDialog.getOpenFileName(self, 'Open Project', '', 'LogiBrick project (*.lbk *.lbkz)')
+
+        if path:
+            try:
+                project = Project.loadProject(path, self.logicData)
+            except (OSError, ValueError, KeyError) as error:
+                QMessageBox.warning(self, 'Error!', str(error))
+                return
+            self.scene.loadProject(project)
+
     def equationPopup(self):
         text, ok = QInputDialog.getText(self, 'Equation', 'Enter Equation: ')
 
         if ok and text:
-            self.scene.addComponentEq(text)
+            try:
+                self.scene.addComponentEq(text)
+            except ValueError as error:
+                QMessageBox.warning(self, 'Error!', str(error))
         elif ok:
             QMessageBox.warning(self, 'Error!', 'Please enter equation!')
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
     app = QApplication(sys.argv)
     window = CircuitDesignerWindow()
     window.show()
@@ -6,6 +6,10 @@ logicFunctions = ("ADD", "SUB", "MULT", "DIV", "MOD", "POWER", "GREATER",
 functionsWithTwoInputs = ("ADD", "SUB", "MULT", "DIV", "MOD", "POWER", "GREATER",
                           "LESS", "MIN", "MAX")
 
+logicFunctionSet = frozenset(logicFunctions)
+
+commutativeFunctions = ("ADD", "MULT", "MIN", "MAX")
+
 functionToBRName = {
     "ADD": "Add",
     "SUB": "Subtract",
@@ -54,8 +58,10 @@ tokenToFuncName = {
     "<": "LESS",
 }
 
+# NEG is unary minus, it binds tighter than * but looser than ^ so -x ^ 2 is -(x ^ 2)
 precedence = {
     "^": 4,
+    "NEG": 3.5,
     "*": 3,
     "/": 3,
     "%": 3,
@@ -65,6 +71,13 @@ precedence = {
     "<": 1
 }
 
+# FMath::Fmod returns 0 instead of NaN when the divisor is this close to zero
+fmodZeroDivisor = 1e-8
+
+def isFmodZeroDivisor(divisor):
+    # Shared by constant folding (floats) and the simulator (NumPy arrays)
+    return abs(divisor) <= fmodZeroDivisor
+
 def makeNumberifNumber(string: str):
         try:
             return float(string)
@@ -0,0 +1,156 @@
+import argparse
+import logging
+import os
+import sys
+
+import Batch
+import ExportCache
+import Optimizer
+import Placement
+
+# Headless batch compiler, turns equations and design files into creations without starting the UI.
+#
+# Equations and equation files produce one creation per equation, design files produce one creation
+# per file with an EQN block for every line. Saved projects (.lbk/.lbkz) can be used as design files. Lines may be prefixed with "Name:" to name the creation,
+# blank lines and lines starting with "#" are skipped, and "-" reads from stdin.
+
+def parseEquationLine(line: str):
+    line = line.strip()
+    if (line == "") or line.startswith("#"):
+        return None
+    name, separator, equation = line.partition(":")
+    if separator and name.strip() and (" " not in name.strip()):
+        return (name.strip(), equation.strip())
+    return (None, line)
+
+def readEquationLines(path: str):
+    if path == "-":
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(path, "r", encoding="utf-8") as file:
+            lines = file.read().splitlines()
+    parsedLines = []
+    for line in lines:
+        parsedLine = parseEquationLine(line)
+        if parsedLine:
+            parsedLines.append(parsedLine)
+    return parsedLines
+
+def parsePalette(text: str):
+    # "#ff0000,#00ff0080" -> [[255, 0, 0, 255], [0, 255, 0, 128]]
+    palette = []
+    for color in text.split(","):
+        color = color.strip().lstrip("#")
+        if len(color) not in (6, 8):
+            raise argparse.ArgumentTypeError(f"expected colors like #rrggbb or #rrggbbaa, got {color}")
+        try:
+            palette.append([int(color[index:index + 2], 16) for index in range(0, len(color), 2)] + ([255] if len(color) == 6 else []))
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"expected colors like #rrggbb or #rrggbbaa, got {color}")
+    return palette
+
+def parseFootprint(text: str):
+    # "16x32" is 16 columns of 32 rows, "x32" leaves the columns unlimited
+    columns, separator, rows = text.lower().partition("x")
+    try:
+        footprint = (int(columns) if columns else None, int(rows))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected COLUMNSxROWS, got {text}")
+    if footprint[1] < 1 or (footprint[0] is not None and footprint[0] < 1):
+        raise argparse.ArgumentTypeError("footprint bounds must be at least 1")
+    return footprint
+
+def collectJobs(args):
+    # Returns a list of (creation name, [equations], project path or None)
+    jobs = []
+    unnamedCount = 0
+
+    def nextName(name):
+        nonlocal unnamedCount
+        if name:
+            return name
+        unnamedCount += 1
+        return args.name + str(unnamedCount)
+
+    for equation in args.equations:
+        if equation == "-":
+            for name, stdinEquation in readEquationLines("-"):
+                jobs.append((nextName(name), [stdinEquation], None))
+        else:
+            name, equation = parseEquationLine(equation) or (None, None)
+            if equation:
+                jobs.append((nextName(name), [equation], None))
+
+    for path in args.file:
+        for name, equation in readEquationLines(path):
+            jobs.append((nextName(name), [equation], None))
+
+    for path in args.design:
+        designName = "stdin" if path == "-" else os.path.splitext(os.path.basename(path))[0]
+        if path.endswith((".lbk", ".lbkz")):
+            jobs.append((designName, None, path))
+            continue
+        equations = [equation for name, equation in readEquationLines(path)]
+        if equations:
+            jobs.append((designName, equations, None))
+
+    return jobs
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="logibrick", description="Compile LogiBrick equations into Brick Rigs creations.")
+    parser.add_argument("equations", nargs="*", help='equations to compile, one creation each ("-" reads them from stdin)')
+    parser.add_argument("-f", "--file", action="append", default=[], help="file with one equation per line, one creation each")
+    parser.add_argument("-d", "--design", action="append", default=[], help="file with one equation per line (or a saved .lbk/.lbkz project), compiled into a single creation")
+    parser.add_argument("-o", "--output-dir", default=None, help="directory to write creations to (defaults to the Brick Rigs vehicle folder)")
+    parser.add_argument("-O", "--optimization-level", type=int, choices=(0, 1, 2), default=Optimizer.defaultOptimizationLevel, help="0: none, 1: constant folding, exact identities and MIN/MAX rebalancing, 2: also strength reduction and ADD/MULT rebalancing")
+    parser.add_argument("--analyze", action="store_true", help="print brick counts, fan-out and the tick depth of every output")
+    parser.add_argument("--prune", action="store_true", help="leave out bricks no output depends on and wire around pass-through ADD x + 0 bricks")
+    parser.add_argument("--footprint", type=parseFootprint, default=(None, 32), metavar="COLUMNSxROWS", help="bricks per column and columns per plane before the layout wraps (default: 32 rows, unlimited columns)")
+    parser.add_argument("--palette", type=parsePalette, default=None, metavar="COLORS", help="comma separated #rrggbb colors to pick brick colors from (default: colors made from each name's hash)")
+    parser.add_argument("--share-subexpressions", action="store_true", help="reuse identical terms across all equations of a creation")
+    parser.add_argument("--cache-dir", default=None, help="where to keep previous exports (default: ~/.cache/logibrick)")
+    parser.add_argument("--no-cache", action="store_true", help="always convert and rewrite every creation")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="export this many creations in parallel (0 uses every core)")
+    parser.add_argument("-n", "--name", default="LogiBrick", help="name prefix for creations without an explicit name")
+    parser.add_argument("-v", "--verbose", action="count", default=0, help="log progress (-v) or every compiled block (-vv)")
+    args = parser.parse_intermixed_args(argv)
+
+    logging.basicConfig(level=(logging.WARNING, logging.INFO, logging.DEBUG)[min(args.verbose, 2)], format="%(levelname)s %(name)s: %(message)s")
+
+    jobs = collectJobs(args)
+    if len(jobs) == 0:
+        parser.error("no equations given")
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    maxColumns, maxRows = args.footprint
+    placement = Placement.BrickPlacement(maxRows=maxRows, maxColumns=maxColumns)
+
+    cache = None if args.no_cache else ExportCache.ExportCache(args.cache_dir)
+    exportJobs = [Batch.ExportJob(name, equations, projectPath, args.output_dir, args.optimization_level, args.share_subexpressions, args.prune, placement, args.analyze, args.palette, cache) for name, equations, projectPath in jobs]
+
+    def progress(done, total, result):
+        if sys.stderr.isatty():
+            print(f"\r[{done}/{total}] {result.name}\033[K", end="" if done < total else "\n", file=sys.stderr, flush=True)
+
+    try:
+        results = Batch.exportBatch(exportJobs, args.jobs if args.jobs > 0 else None, progress)
+    except ValueError as error:
+        parser.error(str(error))
+
+    failures = 0
+    for result in results:
+        if result.analysis is not None:
+            print(f"{result.name}:\n{result.analysis}")
+        if args.prune and result.error is None:
+            print(f"{result.name}: pruned {len(result.removed)} bricks: {', '.join(sorted(result.removed))}" if result.removed else f"{result.name}: pruned 0 bricks")
+        if result.error is not None:
+            failures += 1
+            print(f"{result.name}: failed to compile ({result.error})", file=sys.stderr)
+
+    print(f"Compiled {len(jobs) - failures} of {len(jobs)} creations")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())